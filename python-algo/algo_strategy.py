@@ -3,8 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
-import time
 
 """
 Most of the algo code you write will be in this file unless you create new
@@ -12,11 +10,12 @@ modules yourself. Start by modifying the 'on_turn' function.
 
 Advanced strategy tips: 
 
-  - You can analyze action frames by modifying on_action_frame function
+  - You can analyze action frames by modifying on_action_frame_events, or
+  on_action_frame to see the whole frame
 
   - The GameState.map object can be manually manipulated to create hypothetical 
-  board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  board states. Though, we recommended making a copy with GameState.fork() to 
+  preserve the actual current map state.
 """
 
 
@@ -26,6 +25,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
+        # Only the breach events of action frames are decoded, see on_action_frame_events
+        self.register_frame_events("breach")
+        # Skip frames that queue up while we are busy, their breaches are still passed on
+        self.coalesce_frames = True
+        # Spend at most a second on each turn, see self.deadline
+        self.turn_time_limit = 1
         self.grid_map = []
         j_start = 13
         j_end = 15
@@ -57,18 +62,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         return [y, x]
 
     def evaluate_self_defence(self, game_state):
+        attackers, _ = game_state.threat_map(0)
         for i in range(14, len(self.grid_map)):
             for j in range(len(self.grid_map[i])):
-                board_indices = self.convert_list_index_to_board_index(i, j)
-                number_of_attackers = len(game_state.get_attackers(location=board_indices, player_index=0))
-                self.grid_map[i][j] = number_of_attackers * 8
+                x, y = self.convert_list_index_to_board_index(i, j)
+                self.grid_map[i][j] = attackers[x * game_state.ARENA_SIZE + y] * 8
 
     def evaluate_enemy_defence(self, game_state):
+        attackers, _ = game_state.threat_map(1)
         for i in range(0, 14):
             for j in range(len(self.grid_map[i])):
-                board_indices = self.convert_list_index_to_board_index(i, j)
-                number_of_attackers = len(game_state.get_attackers(location=board_indices, player_index=1))
-                self.grid_map[i][j] = number_of_attackers * 8
+                x, y = self.convert_list_index_to_board_index(i, j)
+                self.grid_map[i][j] = attackers[x * game_state.ARENA_SIZE + y] * 8
 
     def on_game_start(self, config):
         """ 
@@ -94,14 +99,14 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit deployments, and transmitting your intended deployments to the
         game engine.
         """
-        start_time = time.time()
         game_state = gamelib.GameState(self.config, turn_state)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  # Comment or remove this line to enable warnings.
         self.evaluate_self_defence(game_state)
         self.evaluate_enemy_defence(game_state)
-        self.populate_defense(game_state, [13], start_time)
-        self.__place__attackers__(game_state, start_time)
+        # Most of the turn goes to defense, the rest is left for choosing the attack
+        self.populate_defense(game_state, [13], self.deadline.phase("defense", 0.8))
+        self.__place__attackers__(game_state, self.deadline)
         game_state.submit_turn()
 
     """
@@ -109,7 +114,7 @@ class AlgoStrategy(gamelib.AlgoCore):
     strategy and can safely be replaced for your custom algo.
     """
 
-    def populate_defense(self, game_state, defense_holes_x, start_time):
+    def populate_defense(self, game_state, defense_holes_x, deadline):
         defense_locations = []
         defense_priority = [DESTRUCTOR, FILTER, ENCRYPTOR]
         temp = [
@@ -141,18 +146,18 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         threshold = 16.0
         for defense_type in defense_priority:
-            if time.time() - start_time > 1:
+            if deadline.expired():
                 break
             running = True
             while game_state.get_resource(game_state.CORES) >= 1.0 and running:
-                if time.time() - start_time > 1:
+                if deadline.expired():
                     break
                 # find the min defense square
                 for x in range(14, len(self.grid_map)):
-                    if time.time() - start_time > 1:
+                    if deadline.expired():
                         break
                     for y in range(len(self.grid_map[x])):
-                        if time.time() - start_time > 1:
+                        if deadline.expired():
                             break
                         if self.grid_map[x][y] < threshold \
                                 and defense_locations[x - 14][y] is defense_type:
@@ -188,23 +193,22 @@ class AlgoStrategy(gamelib.AlgoCore):
                                                      [left_board_index + 2, right_board_index + 2]
                                                      ]
                                 for index in indices_to_change:
-                                    if time.time() - start_time > 1:
+                                    if deadline.expired():
                                         break
                                     list_index = self.convert_board_index_to_list(index[0], index[1])
                                     if list_index[0] >= 0 and list_index[0] < len(self.grid_map):
                                         if list_index[1] >= 0 and list_index[1] < len(self.grid_map[list_index[0]]):
                                             self.grid_map[list_index[0]][list_index[1]] += 8
 
-    def on_action_frame(self, turn_string):
+    def on_action_frame_events(self, events):
         """
         This is the action frame of the game. This function could be called 
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
+        Only the event types registered in __init__ are decoded. To look at the whole frame, override on_action_frame instead.
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at: https://docs.c1games.com/json-docs.html
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
             location = breach[0]
@@ -216,12 +220,14 @@ class AlgoStrategy(gamelib.AlgoCore):
                 self.scored_on_locations.append(location)
                 gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
 
-    def __place__attackers__(self, game_state, start_time):
+    def __place__attackers__(self, game_state, deadline):
         bits = game_state.get_resource(game_state.BITS)
         if bits < (5 + game_state.turn_number // 10) * 2:
             return None
-        start_location, damage = self.__find_best_start_location__(game_state, start_time)
-        pings, emps, scramblers = self.__find_best_start_unit__(game_state, damage, bits, start_time)
+        start_location, damage = self.__find_best_start_location__(game_state, deadline)
+        if start_location is None:
+            return None
+        pings, emps, scramblers = self.__find_best_start_unit__(game_state, damage, bits)
 
         if pings > 0:
             game_state.attempt_spawn(PING, start_location, pings)
@@ -230,29 +236,29 @@ class AlgoStrategy(gamelib.AlgoCore):
         if scramblers > 0:
             game_state.attempt_spawn(SCRAMBLER, start_location, scramblers)
 
-    def __find_best_start_location__(self, game_state, start_time):
+    def __find_best_start_location__(self, game_state, deadline):
         possible_start_locations = game_state.game_map.get_edge_locations(
             game_state.game_map.BOTTOM_LEFT) + game_state.game_map.get_edge_locations(game_state.game_map.BOTTOM_RIGHT)
 
-        best_start_location = None
-        min_damage = 100000  # damage taken on the path
-        min_path_length = 10000
-        for start_location in possible_start_locations:
-            if game_state.contains_stationary_unit(start_location):
-                continue
-            path = game_state.find_path_to_edge(start_location)
-            damage = 0
-            for location in path:
-                list_location = self.convert_board_index_to_list(location[0], location[1])
-                damage += self.grid_map[list_location[0]][list_location[1]]
-            if damage < min_damage or (damage == min_damage and min_path_length < len(path)):
-                min_damage = damage
-                min_path_length = len(path)
-                best_start_location = start_location
+        def start_locations():
+            # Paths are found one at a time, so running out of time also stops the pathfinding
+            for start_location in possible_start_locations:
+                if game_state.contains_stationary_unit(start_location):
+                    continue
+                path = game_state.find_path_to_edge(start_location)
+                damage = 0  # damage taken on the path
+                for location in path:
+                    list_location = self.convert_board_index_to_list(location[0], location[1])
+                    damage += self.grid_map[list_location[0]][list_location[1]]
+                yield start_location, damage, len(path)
+
+        # Least damage, then the longest path. If time runs out the best location so far is used
+        best = deadline.anytime(start_locations(), lambda option: (-option[1], option[2]), (None, 100000, 0))
+        best_start_location, min_damage, _ = best.value
         return best_start_location, min_damage
 
     # returns count of pings, emps, scramblers in order to be placed.
-    def __find_best_start_unit__(self, game_state, damage, bits, start_time):
+    def __find_best_start_unit__(self, game_state, damage, bits):
         scramblers = 0
         bits = int(bits)
 
@@ -8,5 +8,5 @@ from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "deadline", "frame_parser", "game_state", "game_map", "navigation", "unit", "util"]
  
\ No newline at end of file
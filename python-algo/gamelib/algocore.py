@@ -1,17 +1,70 @@
 import json
+import queue
+import threading
+import time
+from collections import deque
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .frame_parser import parse_frame_events
+from .deadline import turn_deadline
+from .util import get_command, read_commands, debug_write, debug_log, BANNER_TEXT, send_command
+
+def message_type(message):
+    """Reads the message type, the first entry of turnInfo, without decoding the whole message
+
+    Args:
+        * message: A message from the game
+
+    Returns:
+        0 for a turn, 1 for an action frame, 2 for the end of the game, None if the message has no turnInfo
+
+    """
+    start = message.find('"turnInfo"')
+    if start == -1:
+        return None
+    start = message.find('[', start) + 1
+    end = message.find(',', start)
+    try:
+        return int(message[start:end])
+    except ValueError:
+        return int(json.loads(message)["turnInfo"][0])
 
 class AlgoCore(object):
     """This class handles communication with the game itself. Your strategy should subclass it.
 
     Attributes:
         * config (JSON): json object containing information about the game
+        * frame_event_types (list): The event types passed to on_action_frame_events, see register_frame_events
+        * coalesce_frames (bool): If True when start is called, stdin is read on a background thread and action frames
+          that queue up while a frame is being handled are skipped. Only the latest one is passed to on_action_frame,
+          and on_action_frame_events gets the events of every skipped frame as well. Turn messages are never skipped
+        * skipped_frames (int): The number of frames skipped before the last frame that was handled
+        * background_result: What the task registered with register_background_task returned during the last
+          action phase, None if it did not finish or no task is registered. Set before on_turn is called
+        * background_join_share (float): The share of the turn's deadline on_turn waits for the background task
+          to return after it is cancelled. If it is still running after that its result is dropped
+        * background_running (bool): True if the background task was still running after being cancelled. No new task
+          is started until it returns. Set before on_turn is called
+        * deadline (:obj: Deadline): The time budget of the current turn, from the config timing values and the time
+          the engine counted for the previous turn. Set before on_turn is called
+        * turn_time_limit (float): An upper bound in seconds on each turn's deadline, None for no bound
 
     """
     def __init__(self):
         self.config = None
+        self.frame_event_types = []
+        self.coalesce_frames = False
+        self.skipped_frames = 0
+        self._commands = None
+        self._pending_commands = deque()
+        self.background_result = None
+        self._background_task = None
+        self._background = None
+        self.background_join_share = 0.05
+        self.background_running = False
+        self.deadline = None
+        self.turn_time_limit = None
+        self._previous_turn_duration = None
 
     def on_game_start(self, config):
         """
@@ -22,8 +75,8 @@ class AlgoCore(object):
 
     def on_turn(self, game_state):
         """
-        This step function is called every turn and is passed a string containing
-        the current game state, which can be used to initialize a new GameMap
+        This step function is called every turn and is passed the current game state,
+        already decoded from json, which can be used to initialize a new GameState
         """
         self.submit_default_turn()
     
@@ -36,6 +89,145 @@ class AlgoCore(object):
         """
         pass
 
+    def register_frame_events(self, *event_types):
+        """Asks for on_action_frame_events to be called every action frame with the given event types.
+        Only those event lists are decoded, which is much cheaper than decoding the whole frame.
+
+        Args:
+            * event_types: The event types to decode, for example "breach" or "death". See frame_parser.EVENT_TYPES
+
+        """
+        for event_type in event_types:
+            if event_type not in self.frame_event_types:
+                self.frame_event_types.append(event_type)
+
+    def on_action_frame_events(self, events):
+        """
+        This function is called every action frame if any event types were registered with register_frame_events.
+        It is passed a dict mapping each registered event type to the list of those events in the frame.
+        """
+        pass
+
+    def register_background_task(self, task):
+        """Runs a task on a background thread while the engine plays out each action phase, for speculative
+        work for the next turn. For example::
+
+            def precompute(cancelled):
+                # self.last_turn_state was saved by on_turn
+                game_state = gamelib.GameState(self.config, self.last_turn_state)
+                paths = {}
+                for location in game_state.game_map.get_edge_locations(game_state.game_map.BOTTOM_LEFT):
+                    if cancelled.is_set():
+                        break
+                    paths[tuple(location)] = game_state.find_path_to_edge(location)
+                return paths
+
+            self.register_background_task(precompute)
+
+        The task starts after on_turn returns, and is cancelled when the next turn message arrives.
+        Its result is stored in background_result before on_turn is called. The task shares the
+        interpreter with on_action_frame, so it should work on its own GameState objects.
+
+        Args:
+            * task: A function taking a threading.Event that is set when the task is cancelled. It should
+              check the event often and return soon after it is set. on_turn only waits for it for
+              background_join_share of the turn. A task that is still running after that is not started
+              again until it returns, see background_running
+
+        """
+        self._background_task = task
+
+    def _start_background_task(self):
+        """Starts the registered background task, if there is one and the last one has returned
+        """
+        if self._background_task is None or self._background is not None:
+            return
+        task = self._background_task
+        cancelled = threading.Event()
+        outcome = {}
+        def run():
+            try:
+                outcome["result"] = task(cancelled)
+            except Exception as e:
+                debug_write("Background task failed: {}".format(repr(e)))
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self._background = (thread, cancelled, outcome)
+
+    def _finish_background_task(self, timeout):
+        """Cancels the running background task and stores its result in background_result
+
+        Args:
+            * timeout: The number of seconds to wait for the task to return
+
+        """
+        self.background_result = None
+        self.background_running = False
+        if self._background is None:
+            return
+        thread, cancelled, outcome = self._background
+        cancelled.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            #Keep the handle, so a second copy of the task is not started next to it
+            self.background_running = True
+            debug_write("Background task did not stop within {:.3f}s of being cancelled, it is not restarted until it returns".format(timeout))
+            return
+        self._background = None
+        self.background_result = outcome.get("result")
+
+    def _cancel_background_task(self):
+        """Cancels the background task at the end of the game, without waiting for it to return
+        """
+        if self._background is not None:
+            self._background[1].set()
+            self._background = None
+
+    def _next_command(self):
+        """Gets the next message from the game, from the background reader thread if frames are coalesced
+        """
+        if self._commands is None:
+            return get_command()
+        if self._pending_commands:
+            command = self._pending_commands.popleft()
+        else:
+            command = self._commands.get()
+        if command is None:
+            debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+            exit()
+        return command
+
+    def _coalesce_frames(self, frame):
+        """Takes every action frame queued up behind frame, stopping at the first message that is not a frame
+
+        Returns:
+            The frames, oldest first
+        """
+        frames = [frame]
+        while not self._pending_commands:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            if command is not None and message_type(command) == 1:
+                frames.append(command)
+            else:
+                self._pending_commands.append(command)
+        return frames
+
+    def _handle_action_frame(self, frame):
+        """Passes an action frame, or the latest of the queued up frames if coalescing, to the frame hooks
+        """
+        frames = self._coalesce_frames(frame) if self._commands is not None else [frame]
+        self.skipped_frames = len(frames) - 1
+        if self.frame_event_types:
+            events = parse_frame_events(frames[0], self.frame_event_types)
+            for skipped in frames[1:]:
+                for event_type, new_events in parse_frame_events(skipped, self.frame_event_types).items():
+                    events[event_type].extend(new_events)
+            self.on_action_frame_events(events)
+        self.on_action_frame(frames[-1])
+
     def submit_default_turn(self):
         send_command("")
         send_command("")
@@ -47,36 +239,50 @@ class AlgoCore(object):
         it receives the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        if self.coalesce_frames:
+            self._commands = queue.Queue()
+            threading.Thread(target=read_commands, args=(self._commands,), daemon=True).start()
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            game_state_string = self._next_command()
+            stateType = message_type(game_state_string)
+            if stateType is None and "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
                 parsed_config = json.loads(game_state_string)
                 self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+            elif stateType is not None:
+                # The type is read without decoding, so each message is decoded at most once
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
+                    turn_start = time.perf_counter()
+                    state = json.loads(game_state_string)
+                    my_time = float(state.get("p1Stats", [0, 0, 0, 0])[3])
+                    self.deadline = turn_deadline(self.config or {}, my_time, self._previous_turn_duration, turn_start, limit=self.turn_time_limit)
+                    self._finish_background_task(self.deadline.budget * self.background_join_share)
+                    self.on_turn(state)
+                    self._previous_turn_duration = time.perf_counter() - turn_start
+                    self._start_background_task()
+                    # Debug output is buffered, write out everything from the last action phase and this turn
+                    debug_log.flush()
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    self._handle_action_frame(game_state_string)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state quitting bot.")
+                    self._cancel_background_task()
+                    debug_log.flush()
                     break
                 else:
                     """
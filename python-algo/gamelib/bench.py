@@ -0,0 +1,218 @@
+"""
+Benchmarks pathfinding on a fixed corpus of firewall layouts.
+
+Run it from the python-algo directory with::
+
+    python -m gamelib.bench
+    python -m gamelib.bench --layout maze --repeat 50
+
+For every layout and spawn edge it times find_path_to_edge from each open location on the edge,
+and reports the p50 and p99 latency and the peak memory allocated per call. It also times
+GameState.fork on each layout.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from .game_state import GameState
+from .navigation import ShortestPathFinder, PathCache
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "game-configs.json")
+
+TURN_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+
+EDGE_NAMES = ["top_right", "top_left", "bottom_left", "bottom_right"]
+
+def _row(game_map, y, holes=()):
+    """Every location in row y of the arena, except the x values in holes
+    """
+    row_size = y + 1 if y < game_map.HALF_ARENA else game_map.ARENA_SIZE - y
+    start_x = game_map.HALF_ARENA - row_size
+    return [[x, y] for x in range(start_x, start_x + 2 * row_size) if x not in holes]
+
+def empty_layout(game_map):
+    """No firewalls at all"""
+    return []
+
+def maze_layout(game_map):
+    """Horizontal walls with a hole at alternating ends, so units zig zag across the arena"""
+    walls = []
+    for i, y in enumerate([4, 8, 12, 15, 19, 23]):
+        row = _row(game_map, y)
+        hole = row[1] if i % 2 else row[-2]
+        walls += [location for location in row if not location == hole]
+    return walls
+
+def wall_layout(game_map):
+    """A full wall across the middle of the arena with one hole"""
+    return _row(game_map, 13, holes=[20])
+
+def trapped_layout(game_map):
+    """Full walls near both bottom and top edges, so every unit self destructs in its pocket"""
+    return _row(game_map, 5) + _row(game_map, 22)
+
+def random_layout(game_map):
+    """Firewalls on about 30% of the arena, always the same ones"""
+    rng = random.Random(0)
+    return [location for location in game_map if rng.random() < 0.3]
+
+CORPUS = [
+    ("empty", empty_layout),
+    ("maze", maze_layout),
+    ("wall", wall_layout),
+    ("trapped", trapped_layout),
+    ("random", random_layout),
+]
+
+def make_game_state(config, layout):
+    """Creates a turn 0 GameState with a filter on every location of a layout
+    """
+    game_state = GameState(config, TURN_0)
+    game_state.suppress_warnings(True)
+    firewall = config["unitInformation"][0]["shorthand"]
+    for location in layout(game_state.game_map):
+        game_state.game_map.add_unit(firewall, location, 0)
+    #Disable the path cache so every call does the full search
+    game_state._shortest_path_finder = ShortestPathFinder(PathCache(0))
+    return game_state
+
+def percentile(samples, percent):
+    """The nearest rank percentile of a list of samples
+    """
+    ordered = sorted(samples)
+    rank = max(1, int(math.ceil(percent / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+def benchmark_edge(game_state, edge, warmup=3, repeat=20):
+    """Times find_path_to_edge from every open location on an edge
+
+    Args:
+        * game_state: The GameState holding the layout
+        * edge: The edge the units spawn on, game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+        * warmup: The number of untimed passes over the edge
+        * repeat: The number of timed passes over the edge
+
+    Returns:
+        A dict with the number of calls, the p50 and p99 latency in seconds and the mean peak bytes allocated per call.
+        None if every location on the edge is blocked.
+
+    """
+    starts = [location for location in game_state.game_map.get_edge_locations(edge) if not game_state.contains_stationary_unit(location)]
+    if not starts:
+        return None
+
+    for _ in range(warmup):
+        for start in starts:
+            game_state.find_path_to_edge(start)
+
+    times = []
+    for _ in range(repeat):
+        for start in starts:
+            start_time = time.perf_counter()
+            game_state.find_path_to_edge(start)
+            times.append(time.perf_counter() - start_time)
+
+    #Memory is measured on a separate pass, tracing slows every allocation down
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    allocated = 0
+    for start in starts:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        game_state.find_path_to_edge(start)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    if not tracing:
+        tracemalloc.stop()
+
+    return {
+        "calls": len(times),
+        "p50": percentile(times, 50),
+        "p99": percentile(times, 99),
+        "bytes": allocated // len(starts),
+    }
+
+def benchmark_fork(game_state, repeat=200):
+    """Times GameState.fork
+
+    Args:
+        * game_state: The GameState to fork
+        * repeat: The number of timed forks
+
+    Returns:
+        A dict with the number of calls and the p50 and p99 latency in seconds
+
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        game_state.fork()
+        times.append(time.perf_counter() - start_time)
+    return {
+        "calls": len(times),
+        "p50": percentile(times, 50),
+        "p99": percentile(times, 99),
+    }
+
+def run(config, layouts=None, warmup=3, repeat=20):
+    """Benchmarks every spawn edge of every layout in the corpus
+
+    Args:
+        * config: The game config
+        * layouts: The names of the layouts to run, the whole corpus if None
+        * warmup: The number of untimed passes over each edge
+        * repeat: The number of timed passes over each edge
+
+    Returns:
+        A list of (layout name, edge name, result) tuples, see benchmark_edge for the result
+
+    """
+    results = []
+    for name, layout in CORPUS:
+        if layouts and name not in layouts:
+            continue
+        game_state = make_game_state(config, layout)
+        for edge, edge_name in enumerate(EDGE_NAMES):
+            results.append((name, edge_name, benchmark_edge(game_state, edge, warmup, repeat)))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gamelib.bench", description="Benchmark find_path_to_edge on a fixed corpus of firewall layouts")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Path to the game config json")
+    parser.add_argument("--layout", action="append", choices=[name for name, _ in CORPUS], help="Only run this layout, can be given more than once")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed passes over each edge")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed passes over each edge")
+    parser.add_argument("--max-p99", type=float, help="Exit with status 1 if any p99 latency is above this many milliseconds")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as config_file:
+        config = json.load(config_file)
+
+    print("{:<10}{:<14}{:>8}{:>12}{:>12}{:>14}".format("layout", "edge", "calls", "p50 ms", "p99 ms", "bytes/call"))
+    slow = False
+    for name, edge_name, result in run(config, args.layout, args.warmup, args.repeat):
+        if result is None:
+            print("{:<10}{:<14}{:>8}".format(name, edge_name, "blocked"))
+            continue
+        print("{:<10}{:<14}{:>8}{:>12.3f}{:>12.3f}{:>14}".format(name, edge_name, result["calls"], result["p50"] * 1000, result["p99"] * 1000, result["bytes"]))
+        if args.max_p99 is not None and result["p99"] * 1000 > args.max_p99:
+            slow = True
+
+    print()
+    print("{:<10}{:>8}{:>12}{:>12}".format("layout", "forks", "p50 us", "p99 us"))
+    for name, layout in CORPUS:
+        if args.layout and name not in args.layout:
+            continue
+        result = benchmark_fork(make_game_state(config, layout))
+        print("{:<10}{:>8}{:>12.1f}{:>12.1f}".format(name, result["calls"], result["p50"] * 1e6, result["p99"] * 1e6))
+    return 1 if slow else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import time
+
+class Deadline:
+    """A time budget that long running code checks cooperatively, instead of reading the clock itself
+
+    AlgoCore creates one for every turn, see turn_deadline. For example::
+
+        defense = self.deadline.phase("defense", 0.5)
+        for location in candidates:
+            if defense.expired():
+                break
+            ...
+
+    Attributes:
+        * budget (float): The number of seconds available
+        * start (float): The clock time the budget started at
+        * end (float): The clock time the budget runs out at
+        * phases (dict): The Deadlines created with phase, keyed on their names
+
+    """
+    def __init__(self, budget, start=None, clock=time.perf_counter):
+        self.clock = clock
+        self.budget = max(budget, 0)
+        self.start = clock() if start is None else start
+        self.end = self.start + self.budget
+        self.phases = {}
+
+    def elapsed(self):
+        """The number of seconds since the budget started
+        """
+        return self.clock() - self.start
+
+    def remaining(self):
+        """The number of seconds left, 0 once the budget has run out
+        """
+        return max(self.end - self.clock(), 0)
+
+    def expired(self):
+        """True once the budget has run out. Cheap enough to call in hot loops
+        """
+        return self.clock() >= self.end
+
+    def phase(self, name, share=1.0):
+        """Splits off part of the remaining time for a named phase of work
+
+        Args:
+            * name: The name of the phase, used as its key in phases
+            * share: The fraction of the remaining time the phase gets. Time a phase does not use stays available to later phases
+
+        Returns:
+            A Deadline for the phase, which never ends after this one
+
+        """
+        now = self.clock()
+        child = Deadline(max(self.end - now, 0) * min(max(share, 0), 1), now, self.clock)
+        self.phases[name] = child
+        return child
+
+    def anytime(self, candidates, score, default=None):
+        """Scores candidates until they run out or the budget does, keeping the best one so far
+
+        Args:
+            * candidates: An iterable of candidate plans. It is consumed lazily, so it can be a generator
+            * score: A function giving a candidate's score, higher is better. Ties keep the earlier candidate
+            * default: The plan to use if no candidate could be scored in time
+
+        Returns:
+            An AnytimeResult with the best candidate
+
+        """
+        result = AnytimeResult(default)
+        for candidate in candidates:
+            if self.expired():
+                return result
+            result.offer(candidate, score(candidate))
+        result.complete = True
+        return result
+
+class AnytimeResult:
+    """The best plan found so far by an anytime computation
+
+    Attributes:
+        * value: The best plan so far, or the default if nothing was offered
+        * score: The score of value, None if nothing was offered
+        * offered (int): The number of plans offered
+        * complete (bool): True if every candidate was scored before the deadline
+
+    """
+    __slots__ = ("value", "score", "offered", "complete")
+
+    def __init__(self, default=None):
+        self.value = default
+        self.score = None
+        self.offered = 0
+        self.complete = False
+
+    def offer(self, value, score):
+        """Keeps value if it scores higher than the best plan so far
+
+        Returns:
+            True if value is the new best plan
+
+        """
+        self.offered += 1
+        if self.score is None or score > self.score:
+            self.value = value
+            self.score = score
+            return True
+        return False
+
+def turn_deadline(config, my_time=0, previous_duration=None, start=None, safety=0.8, limit=None):
+    """Creates the Deadline for a turn from the config's timing values
+
+    The budget is the safe part of waitTimeBotSoft, less the time the engine counted against us last turn
+    beyond what we measured ourselves, such as start up and communication overhead.
+
+    Args:
+        * config: The game config
+        * my_time: The time in milliseconds the engine says we took on the previous turn, GameState.my_time
+        * previous_duration: The time in seconds we measured for the previous turn, None if unknown
+        * start: The clock time the turn message arrived, now if None
+        * safety: The fraction of waitTimeBotSoft to use
+        * limit: An upper bound on the budget in seconds, None for no bound
+
+    Returns:
+        A Deadline for the turn
+
+    """
+    timing = config.get("timingAndReplay", {})
+    soft_limit = timing.get("waitTimeBotSoft", timing.get("waitTimeBotMax", 5000)) / 1000.0
+    budget = soft_limit * safety
+    if previous_duration is not None:
+        budget -= max(my_time / 1000.0 - previous_duration, 0)
+    if limit is not None:
+        budget = min(budget, limit)
+    return Deadline(budget, start)
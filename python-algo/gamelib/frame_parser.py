@@ -0,0 +1,37 @@
+import json
+import re
+
+# The event types in the "events" section of an action frame
+EVENT_TYPES = ["selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee"]
+
+_decoder = json.JSONDecoder()
+_events_pattern = re.compile(r'"events"\s*:\s*\{')
+_event_patterns = {event_type: re.compile(r'"{}"\s*:\s*'.format(event_type)) for event_type in EVENT_TYPES}
+
+def parse_frame_events(frame, event_types):
+    """Decodes only the requested event lists of an action frame
+
+    The rest of the frame, including the unit lists, is skipped rather than decoded.
+    Full doc on the frame format at: https://docs.c1games.com/json-docs.html
+
+    Args:
+        * frame: An action frame as a json string
+        * event_types: The event types to decode, for example ["breach", "death"]. See EVENT_TYPES
+
+    Returns:
+        A dict mapping each requested event type to its list of events, an empty list if the frame has none
+
+    """
+    events = {}
+    match = _events_pattern.search(frame)
+    start = match.end() if match else len(frame)
+    for event_type in event_types:
+        pattern = _event_patterns.get(event_type)
+        if pattern is None:
+            pattern = _event_patterns[event_type] = re.compile(r'"{}"\s*:\s*'.format(re.escape(event_type)))
+        match = pattern.search(frame, start)
+        if match is None:
+            events[event_type] = []
+            continue
+        events[event_type], _ = _decoder.raw_decode(frame, match.end())
+    return events
@@ -1,7 +1,64 @@
 import math
+import random
+from array import array
 from .unit import GameUnit
 from .util import debug_write
 
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+def _build_arena_tables():
+    """Builds the lookup tables for the diamond shaped arena, indexed by x * ARENA_SIZE + y
+    """
+    in_arena = bytearray(ARENA_SIZE * ARENA_SIZE)
+    locations = []
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        for x in range(HALF_ARENA - row_size, HALF_ARENA + row_size):
+            in_arena[x * ARENA_SIZE + y] = 1
+            locations.append((x, y))
+
+    coordinates = [(x, y) for x in range(ARENA_SIZE) for y in range(ARENA_SIZE)]
+    neighbors = []
+    for x, y in coordinates:
+        # Up, down, right, left. Pathfinding tie-breaking depends on this order
+        adjacent = ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+        neighbors.append(tuple(nx * ARENA_SIZE + ny for nx, ny in adjacent
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and in_arena[nx * ARENA_SIZE + ny]))
+    return bytes(in_arena), tuple(locations), tuple(coordinates), tuple(neighbors)
+
+# IN_ARENA: 1 for each index inside the arena. ARENA_LOCATIONS: every (x, y) in the arena, in iteration order.
+# COORDINATES: the (x, y) of each index. NEIGHBORS: the indices of the in-arena locations adjacent to each index.
+IN_ARENA, ARENA_LOCATIONS, COORDINATES, NEIGHBORS = _build_arena_tables()
+
+# One random 64 bit key per tile, xored together for every blocked tile to hash the firewall layout
+_zobrist_random = random.Random(0x7E12)
+ZOBRIST_KEYS = [_zobrist_random.getrandbits(64) for _ in range(ARENA_SIZE * ARENA_SIZE)]
+
+# A unit with a given range affects all locations who's centers are within that range + 0.51
+HIT_RADIUS = 0.51
+
+# Range disks and per index results of _locations_in_range, keyed on radius. Shared by every GameMap
+_range_disks = {}
+_range_locations = {}
+
+def range_disk(radius):
+    """The (dx, dy) offsets of every location within radius + HIT_RADIUS of a location, in x then y order
+    """
+    disk = _range_disks.get(radius)
+    if disk is None:
+        reach = int(math.ceil(radius + HIT_RADIUS))
+        disk = tuple((dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+            if math.sqrt(dx * dx + dy * dy) < radius + HIT_RADIUS)
+        _range_disks[radius] = disk
+    return disk
+
+def _disk_locations(x, y, radius):
+    """The in arena locations of the range disk around [x, y]
+    """
+    return tuple((x + dx, y + dy) for dx, dy in range_disk(radius)
+        if 0 <= x + dx < ARENA_SIZE and 0 <= y + dy < ARENA_SIZE and IN_ARENA[(x + dx) * ARENA_SIZE + y + dy])
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -17,6 +74,19 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * blocked_mask (bytearray): 1 at index x * ARENA_SIZE + y if a firewall is at [x, y], 0 otherwise.
+          Kept up to date by add_unit, remove_unit and item assignment. Editing the unit lists returned by
+          game_map[x, y] directly will not update it.
+        * blocked_hash (int): A Zobrist hash of blocked_mask. Equal firewall layouts have equal hashes.
+        * unit_type_codes (dict): Maps each unit type to its index in the config's unitInformation
+        * owner (array): The player_index of the firewall at each index, -1 if there is no firewall
+        * firewall_type (array): The unit_type_codes entry of the firewall at each index, -1 if there is no firewall
+        * stability (array): The stability of the firewall at each index, 0 if there is no firewall
+        * mobile_counts (dict): Maps each information unit type to an array of the number of units of that type at each index
+        * firewall_version (int): Increases whenever the owner or type of a firewall on the map changes
+
+        The per index arrays are kept up to date the same way as blocked_mask. Changing the stability
+        of a unit directly will not update them.
 
     """
     def __init__(self, config):
@@ -28,14 +98,31 @@ class GameMap:
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.TOP_RIGHT = 0
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        tiles = self.ARENA_SIZE * self.ARENA_SIZE
+        self.blocked_mask = bytearray(tiles)
+        self.blocked_hash = 0
+        self.unit_type_codes = {}
+        self.mobile_counts = {}
+        for code, type_config in enumerate(config.get("unitInformation", [])):
+            unit_type = type_config.get("shorthand")
+            self.unit_type_codes[unit_type] = code
+            if "speed" in type_config:
+                self.mobile_counts[unit_type] = array('H', bytes(2 * tiles))
+        for type_config in config.get("unitInformation", []):
+            if "range" in type_config:
+                range_disk(type_config["range"])
+        self.owner = array('b', [-1]) * tiles
+        self.firewall_type = array('b', [-1]) * tiles
+        self.stability = array('d', bytes(8 * tiles))
+        self.firewall_version = 0
+        self._undo_log = None
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -45,26 +132,14 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            self._record(location[0], location[1])
             self.__map[location[0]][location[1]] = val
+            self._update_location(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in ARENA_LOCATIONS)
 
     def __empty_grid(self):
         grid = []
@@ -74,6 +149,121 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def fork(self):
+        """Creates a copy of the map that can be changed without affecting this one
+
+        Only the grid of unit lists and the per index arrays are copied. The unit lists themselves and
+        the GameUnits in them are shared, add_unit, remove_unit and item assignment replace lists rather
+        than changing them. Changing a shared list or unit directly will change both maps.
+
+        Returns:
+            A new GameMap with the same units
+
+        """
+        child = object.__new__(type(self))
+        child.__dict__.update(self.__dict__)
+        child.__map = [column[:] for column in self.__map]
+        child.blocked_mask = bytearray(self.blocked_mask)
+        child.owner = self.owner[:]
+        child.firewall_type = self.firewall_type[:]
+        child.stability = self.stability[:]
+        child.mobile_counts = {unit_type: counts[:] for unit_type, counts in self.mobile_counts.items()}
+        child._undo_log = None
+        return child
+
+    def checkpoint(self):
+        """Starts recording changes to the map so they can be undone with rollback. For example::
+
+            checkpoint = game_map.checkpoint()
+            game_map.add_unit(FILTER, [13, 5])
+            game_map.rollback(checkpoint)   # [13, 5] is empty again
+
+        Checkpoints can be nested. Changes are recorded until the map is rolled back to the first checkpoint,
+        or the changes are kept with commit.
+
+        Returns:
+            A checkpoint to pass to rollback or commit
+
+        """
+        if self._undo_log is None:
+            self._undo_log = []
+        return len(self._undo_log)
+
+    def rollback(self, checkpoint):
+        """Undoes every change made since a checkpoint
+
+        Args:
+            * checkpoint: A checkpoint returned by checkpoint
+
+        """
+        if self._undo_log is None or checkpoint > len(self._undo_log):
+            self.warn("Attempted to roll back to checkpoint {} which is not recorded".format(checkpoint))
+            return
+        undo_log = self._undo_log
+        while len(undo_log) > checkpoint:
+            entry = undo_log.pop()
+            entry[0](*entry[1:])
+        if checkpoint == 0:
+            self._undo_log = None
+
+    def commit(self, checkpoint):
+        """Keeps every change made since a checkpoint. Committing the first checkpoint stops recording and
+        empties the undo log. A nested checkpoint's changes stay recorded, so an outer checkpoint can still undo them
+
+        Args:
+            * checkpoint: A checkpoint returned by checkpoint
+
+        """
+        if self._undo_log is None or checkpoint > len(self._undo_log):
+            self.warn("Attempted to commit checkpoint {} which is not recorded".format(checkpoint))
+            return
+        if checkpoint == 0:
+            self._undo_log = None
+
+    def _record(self, x, y):
+        """Adds the units at a location to the undo log before they change, if a checkpoint is active
+        """
+        if self._undo_log is not None:
+            self._undo_log.append((self._restore_location, x, y, self.__map[x][y]))
+
+    def _restore_location(self, x, y, units):
+        """Puts back the unit list a location had before a change
+        """
+        self.__map[x][y] = units
+        self._update_location(x, y)
+
+    def _update_location(self, x, y):
+        """Recomputes blocked_mask and the per index arrays for a single location from the units on it
+        """
+        index = x * self.ARENA_SIZE + y
+        firewall = None
+        for counts in self.mobile_counts.values():
+            counts[index] = 0
+        for unit in self.__map[x][y]:
+            if unit.stationary:
+                if firewall is None:
+                    firewall = unit
+            else:
+                self.mobile_counts[unit.unit_type][index] += 1
+
+        if firewall is None:
+            owner, firewall_type, stability = -1, -1, 0
+        else:
+            owner, firewall_type, stability = firewall.player_index, firewall.stats.type_code, firewall.stability
+        self._set_blocked(index, 0 if firewall is None else 1)
+        if not self.owner[index] == owner or not self.firewall_type[index] == firewall_type:
+            self.owner[index] = owner
+            self.firewall_type[index] = firewall_type
+            self.firewall_version += 1
+        self.stability[index] = stability
+
+    def _set_blocked(self, index, blocked):
+        """Sets a flag in blocked_mask, keeping blocked_hash in sync
+        """
+        if not self.blocked_mask[index] == blocked:
+            self.blocked_mask[index] = blocked
+            self.blocked_hash ^= ZOBRIST_KEYS[index]
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -170,10 +360,14 @@ class GameMap:
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        self._record(x, y)
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            # A new list rather than append, the old one may be shared with a fork
+            self.__map[x][y] = self.__map[x][y] + [new_unit]
+            self.mobile_counts[unit_type][x * self.ARENA_SIZE + y] += 1
         else:
             self.__map[x][y] = [new_unit]
+            self._update_location(x, y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -188,7 +382,9 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
+        self._record(x, y)
         self.__map[x][y] = []
+        self._update_location(x, y)
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -198,22 +394,30 @@ class GameMap:
             * radius: The radius of our search area
 
         Returns:
-            The locations that are within our search area
+            A list of the [x, y] locations that are within our search area
 
+        """
+        return [[x, y] for x, y in self._locations_in_range(location, radius)]
+
+    def _locations_in_range(self, location, radius):
+        """Like get_locations_in_range, but gives a cached tuple of (x, y) tuples that is shared between calls.
+        Used by hot loops that only read the locations
         """
         if radius < 0 or radius > self.ARENA_SIZE:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
-        if not self.in_arena_bounds(location):
-            self._invalid_coordinates(location)
 
         x, y = location
-        locations = []
-        for i in range(int(x - radius), int(x + radius + 1)):
-            for j in range(int(y - radius), int(y + radius + 1)):
-                new_location = [i, j]
-                # A unit with a given range affects all locations who's centers are within that range + 0.51 so we add 0.51 here
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + 0.51:
-                    locations.append(new_location)
+        index = x * self.ARENA_SIZE + y
+        if not (0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE and IN_ARENA[index]):
+            self._invalid_coordinates(location)
+            return _disk_locations(x, y, radius)
+
+        per_index = _range_locations.get(radius)
+        if per_index is None:
+            per_index = _range_locations[radius] = [None] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        locations = per_index[index]
+        if locations is None:
+            locations = per_index[index] = _disk_locations(x, y, radius)
         return locations
 
     def distance_between_locations(self, location_1, location_2):
@@ -1,8 +1,9 @@
 import math
 import json
+from array import array
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_command, debug_write, WARNING
 from .unit import GameUnit
 from .game_map import GameMap
 
@@ -37,34 +38,41 @@ class GameState:
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, lazy_units=False):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              Can also be the already decoded json, as passed to AlgoCore.on_turn
+            * lazy_units (bool): If True, the units are only added to game_map the first time it is used.
+              Resources, health and the turn number are available straight away
 
         """
         self.serialized_string = serialized_string
+        self._lazy_units = lazy_units
+        self._pending_units = None
         self.config = config
         self.enable_warnings = True
 
         global FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, REMOVE, FIREWALL_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
+        # Filled in before it is assigned, so threads using the globals never see a partly built table
+        unit_type_to_index = {}
         FILTER = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[FILTER] = 0
+        unit_type_to_index[FILTER] = 0
         ENCRYPTOR = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[ENCRYPTOR] = 1
+        unit_type_to_index[ENCRYPTOR] = 1
         DESTRUCTOR = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DESTRUCTOR] = 2
+        unit_type_to_index[DESTRUCTOR] = 2
         PING = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[PING] = 3
+        unit_type_to_index[PING] = 3
         EMP = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[EMP] = 4
+        unit_type_to_index[EMP] = 4
         SCRAMBLER = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCRAMBLER] = 5
+        unit_type_to_index[SCRAMBLER] = 5
         REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
+        unit_type_to_index[REMOVE] = 6
+        UNIT_TYPE_TO_INDEX = unit_type_to_index
 
         ALL_UNITS = [PING, EMP, SCRAMBLER, FILTER, ENCRYPTOR, DESTRUCTOR]
         FIREWALL_TYPES = [FILTER, ENCRYPTOR, DESTRUCTOR]
@@ -76,6 +84,7 @@ class GameState:
 
         self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self._threat_maps = {}
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
@@ -83,12 +92,72 @@ class GameState:
                 {'cores': 0, 'bits': 0}]  # player 1, which is the opponent
         self.__parse_state(serialized_string)
 
+    def fork(self):
+        """Creates a copy of the game state for trying out hypothetical builds. For example::
+
+            for location in candidates:
+                child = game_state.fork()
+                child.attempt_spawn(DESTRUCTOR, location)
+                score = evaluate(child)
+
+        Resources, the build and deploy stacks and the game map are private to the copy, so spawning
+        in it does not change this state. GameUnits and the pathfinder are shared. See GameMap.fork.
+
+        Returns:
+            A new GameState of the same type
+
+        """
+        child = object.__new__(type(self))
+        child.__dict__.update(self.__dict__)
+        child.game_map = self.game_map.fork()
+        child._threat_maps = dict(self._threat_maps)
+        child._build_stack = list(self._build_stack)
+        child._deploy_stack = list(self._deploy_stack)
+        child._player_resources = [dict(resources) for resources in self._player_resources]
+        return child
+
+    def checkpoint(self):
+        """Starts recording changes so they can be undone with rollback, as an alternative to fork
+        when searching over builds. For example::
+
+            checkpoint = game_state.checkpoint()
+            game_state.attempt_spawn(DESTRUCTOR, [13, 5])
+            score = evaluate(game_state)
+            game_state.rollback(checkpoint)
+
+        attempt_spawn, attempt_remove and changes to the game map are recorded. Checkpoints can be nested.
+        Use commit to keep the changes and stop recording.
+
+        Returns:
+            A checkpoint to pass to rollback or commit
+
+        """
+        return self.game_map.checkpoint()
+
+    def rollback(self, checkpoint):
+        """Undoes every spawn, removal and game map change made since a checkpoint
+
+        Args:
+            * checkpoint: A checkpoint returned by checkpoint
+
+        """
+        self.game_map.rollback(checkpoint)
+
+    def commit(self, checkpoint):
+        """Keeps every spawn, removal and game map change made since a checkpoint. See GameMap.commit
+
+        Args:
+            * checkpoint: A checkpoint returned by checkpoint
+
+        """
+        self.game_map.commit(checkpoint)
+
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or already decoded.
         """
-        state = json.loads(state_line)
+        state = json.loads(state_line) if isinstance(state_line, str) else state_line
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -108,9 +177,26 @@ class GameState:
         p1units = state["p1Units"]
         p2units = state["p2Units"]
 
+        if self._lazy_units:
+            self._pending_units = (p1units, p2units)
+            return
         self.__create_parsed_units(p1units, 0)
         self.__create_parsed_units(p2units, 1)
 
+    @property
+    def game_map(self):
+        if self._pending_units is not None:
+            p1units, p2units = self._pending_units
+            self._pending_units = None
+            self.__create_parsed_units(p1units, 0)
+            self.__create_parsed_units(p2units, 1)
+        return self._game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        self._game_map = game_map
+        self._pending_units = None
+
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -130,6 +216,7 @@ class GameState:
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
                     self.game_map[x,y].append(unit)
+                    self.game_map._update_location(x, y)
 
     def __resource_required(self, unit_type):
         return self.CORES if is_stationary(unit_type) else self.BITS
@@ -144,6 +231,8 @@ class GameState:
         elif resource_type == self.CORES:
             resource_key = 'cores'
         held_resource = self.get_resource(resource_type, player_index)
+        if self.game_map._undo_log is not None:
+            self.game_map._undo_log.append((self._player_resources[player_index].__setitem__, resource_key, held_resource))
         self._player_resources[player_index][resource_key] = held_resource + amount
 
     def _invalid_player_index(self, index):
@@ -330,10 +419,10 @@ class GameState:
                     resource_type = self.__resource_required(unit_type)
                     self.__set_resource(resource_type, 0 - cost)
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
+                    stack = self._build_stack if is_stationary(unit_type) else self._deploy_stack
+                    stack.append((unit_type, x, y))
+                    if self.game_map._undo_log is not None:
+                        self.game_map._undo_log.append((stack.pop,))
                     spawned_units += 1
         return spawned_units
 
@@ -354,6 +443,8 @@ class GameState:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
                 self._build_stack.append((REMOVE, x, y))
+                if self.game_map._undo_log is not None:
+                    self.game_map._undo_log.append((self._build_stack.pop,))
                 removed_units += 1
             else:
                 self.warn("Could not remove a unit from {}. Location has no firewall or is enemy territory.".format(location))
@@ -395,6 +486,142 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def find_path_result(self, start_location, target_edge=None):
+        """Gets the path a unit at a given location would take, along with whether it reaches the edge
+
+        Args:
+            * start_location: The location of a hypothetical unit
+            * target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Will auto calculate if None.
+
+        Returns:
+            A PathResult with the path, whether the edge was reached, the self destruct location and the number of steps
+
+        """
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return self._shortest_path_finder.navigate_to_result(start_location, end_points, self)
+
+    def find_path_to_each_edge(self, start_location, target_edges=None):
+        """Gets the paths a unit at a given location would take to each of several edges.
+        This is cheaper than calling find_path_to_edge once for each edge.
+
+        Args:
+            * start_location: The location of a hypothetical unit
+            * target_edges: A list of edges, game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. All four edges if None.
+
+        Returns:
+            A list with the path to each edge, in the same order as target_edges. With the default
+            target_edges, paths[game_map.TOP_LEFT] is the path to the top left edge and so on.
+
+        """
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+
+        if target_edges is None:
+            target_edges = [self.game_map.TOP_RIGHT, self.game_map.TOP_LEFT, self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]
+
+        edges_end_points = [self.game_map.get_edge_locations(edge) for edge in target_edges]
+        return self._shortest_path_finder.navigate_to_each_edge(start_location, edges_end_points, self)
+
+    def find_paths_to_edge(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take
+
+        This gives the same paths as calling find_path_to_edge for each location, but only does
+        the expensive part of pathfinding once for each target edge and pocket of pathable space.
+
+        Args:
+            * start_locations: A list of locations of hypothetical units
+            * target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Will auto calculate for each location if None.
+
+        Returns:
+            A list with the path for each location in start_locations, in the same order.
+            The entry is None if the location is blocked.
+
+        """
+        edge_starts = {}
+        for i, start_location in enumerate(start_locations):
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            edge_starts.setdefault(edge, []).append(i)
+
+        paths = [None] * len(start_locations)
+        for edge, indices in edge_starts.items():
+            end_points = self.game_map.get_edge_locations(edge)
+            edge_paths = self._shortest_path_finder.navigate_multiple_starts([start_locations[i] for i in indices], end_points, self)
+            for i, path in zip(indices, edge_paths):
+                paths[i] = path
+        return paths
+
+    def find_rerouted_path(self, start_location, unblock_events, target_edge=None, unit_type=None):
+        """Gets the locations a unit at a given location would move through as firewalls are destroyed during the round.
+        Units reroute when a firewall dies, so this predicts where they end up against a defense we expect to break. For example::
+
+            # the firewall at [13, 5] is destroyed on frame 10
+            trajectory = game_state.find_rerouted_path([13, 0], [(10, [13, 5])])
+
+        The game map itself is not changed.
+
+        Args:
+            * start_location: The location of a hypothetical unit
+            * unblock_events: A list of (frame, location) pairs, one for each firewall that is destroyed and the frame it is destroyed on
+            * target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Will auto calculate if None.
+            * unit_type: The type of the unit, used for its speed. Moves one location per frame if None
+
+        Returns:
+            A list with the location of the unit on each frame, starting at frame 0. The last location
+            is where the unit reaches the edge or self destructs
+
+        """
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+
+        speed = 1
+        if unit_type is not None:
+            if unit_type not in ALL_UNITS or is_stationary(unit_type):
+                self._invalid_unit(unit_type)
+                return
+            speed = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]["speed"]
+
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return self._shortest_path_finder.navigate_with_reroutes(start_location, end_points, self, unblock_events, speed)
+
+    def create_path_field(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take, in a form that can be cheaply updated
+        when testing hypothetical firewall placements. For example::
+
+            field = game_state.create_path_field(locations, game_state.game_map.TOP_RIGHT)
+            changed = field.set_blocked([13, 5])   # pretend a firewall is at [13, 5]
+            field.set_blocked([13, 5], False)      # and take it away again
+
+        The game map itself is not changed.
+
+        Args:
+            * start_locations: A list of locations of hypothetical units
+            * target_edge: The edge the units want to reach. Will auto calculate from the first location if None.
+
+        Returns:
+            A PathField. Its paths attribute holds the path of each location, keyed on (x, y) tuples
+
+        """
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_locations[0])
+
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return self._shortest_path_finder.create_field(start_locations, end_points, self)
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked
 
@@ -409,6 +636,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not self.game_map.blocked_mask[x * self.ARENA_SIZE + y]:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -416,7 +645,7 @@ class GameState:
 
     def warn(self, message):
         if(self.enable_warnings):
-            debug_write(message)
+            debug_write(message, level=WARNING)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -427,7 +656,7 @@ class GameState:
         """
 
         self.enable_warnings = not suppress
-        self.game_map.enable_warnings = not suppress
+        self._game_map.enable_warnings = not suppress
 
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
@@ -449,7 +678,7 @@ class GameState:
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.range)
+        possible_locations = self.game_map._locations_in_range(attacker_location, attacking_unit.range)
         target = None
         target_stationary = True
         target_distance = sys.maxsize
@@ -532,9 +761,59 @@ class GameState:
         """
         Get locations in the range of DESTRUCTOR units
         """
-        possible_locations= self.game_map.get_locations_in_range(location, self.config["unitInformation"][UNIT_TYPE_TO_INDEX[DESTRUCTOR]]["range"])
+        possible_locations = self.game_map._locations_in_range(location, self.config["unitInformation"][UNIT_TYPE_TO_INDEX[DESTRUCTOR]]["range"])
+        firewall_type = self.game_map.firewall_type
+        owner = self.game_map.owner
+        destructor = UNIT_TYPE_TO_INDEX[DESTRUCTOR]
         for location in possible_locations:
-            for unit in self.game_map[location]:
-                if unit.unit_type == DESTRUCTOR and unit.player_index != player_index:
-                    attackers.append(unit)
+            index = location[0] * self.ARENA_SIZE + location[1]
+            if firewall_type[index] == destructor and not owner[index] == player_index:
+                for unit in self.game_map[location]:
+                    if unit.stationary:
+                        attackers.append(unit)
+                        break
         return attackers
+
+    def threat_map(self, player_index):
+        """Gets how threatened every location is for units controlled by a player
+
+        Every enemy destructor adds its damage to each location in its range, so the whole map costs one pass
+        over the destructors instead of a get_attackers call per location. The result is cached until a firewall
+        is added or removed.
+
+        Args:
+            * player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A tuple of two arrays indexed by x * ARENA_SIZE + y. The first holds the number of destructors
+            that would attack a unit at the location, the second the total damage they deal per frame.
+            The arrays are shared between calls and should not be modified.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+
+        version = self.game_map.firewall_version
+        cached = self._threat_maps.get(player_index)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        tiles = self.ARENA_SIZE * self.ARENA_SIZE
+        attackers = array('H', bytes(2 * tiles))
+        damage = array('d', bytes(8 * tiles))
+        destructor_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[DESTRUCTOR]]
+        destructor_range = destructor_config["range"]
+        destructor_damage = destructor_config["damage"]
+        destructor = UNIT_TYPE_TO_INDEX[DESTRUCTOR]
+        firewall_type = self.game_map.firewall_type
+        owner = self.game_map.owner
+        for index in range(tiles):
+            if firewall_type[index] == destructor and not owner[index] == player_index:
+                for x, y in self.game_map._locations_in_range([index // self.ARENA_SIZE, index % self.ARENA_SIZE], destructor_range):
+                    attacked = x * self.ARENA_SIZE + y
+                    attackers[attacked] += 1
+                    damage[attacked] += destructor_damage
+
+        threat = (attackers, damage)
+        self._threat_maps[player_index] = (version, threat)
+        return threat
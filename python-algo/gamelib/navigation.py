@@ -1,24 +1,172 @@
 import heapq
 import math
 import sys
-import queue
+import threading
+from array import array
+from collections import OrderedDict, deque
+from .game_map import ARENA_SIZE, IN_ARENA, COORDINATES, NEIGHBORS
 from .util import debug_write
 
-class Node:
-    """A pathfinding node
+# NumPy is only imported once a NumpyShortestPathFinder is created, so algos that do not use it start faster
+np = None
+
+def _import_numpy():
+    """Imports NumPy the first time it is needed
+
+    Returns:
+        True if NumPy is installed
+
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+class PathCache:
+    """A least recently used cache of paths
+
+    Paths are keyed on the start location, the end points and the blocked_hash of the game map,
+    so a cached path is never returned after the firewall layout changes.
+
+    Attributes:
+        * maxsize (int): The maximum number of paths to keep, 0 disables the cache
+        * hits (int): The number of lookups that found a cached path
+        * misses (int): The number of lookups that did not find a cached path
+
+    The cache can be shared between threads, such as AlgoCore's background task and the main thread.
+
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Gets a copy of a cached path, or None if there is no path for the key
+        """
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._paths.move_to_end(key)
+        return [[x, y] for x, y in path]
+
+    def put(self, key, path):
+        """Caches a path, evicting the least recently used paths if the cache is full
+        """
+        if self.maxsize <= 0:
+            return
+        path = tuple((x, y) for x, y in path)
+        with self._lock:
+            self._paths[key] = path
+            self._paths.move_to_end(key)
+            while len(self._paths) > self.maxsize:
+                self._paths.popitem(last=False)
+
+    def resize(self, maxsize):
+        """Changes the maximum number of cached paths
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._paths) > max(maxsize, 0):
+                self._paths.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached paths and resets the counters
+        """
+        with self._lock:
+            self._paths.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __deepcopy__(self, memo):
+        #Cached paths are keyed on the board, so copies of a GameState can keep sharing the cache
+        return self
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_paths"] = self._paths.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+class PathResult:
+    """The outcome of pathing a unit towards an edge
+
+    Attributes:
+        * path (list): The locations the unit moves through, starting with its start location
+        * reached_edge (bool): True if the path ends on the target edge
+        * self_destruct_location (list): The location the unit self destructs at if it cannot reach the edge, None otherwise
+        * length (int): The number of steps the unit takes, len(path) - 1
+
+    """
+    __slots__ = ("path", "reached_edge", "self_destruct_location", "length")
+
+    def __init__(self, path, end_points):
+        self.path = path
+        self.reached_edge = path[-1] in end_points
+        self.self_destruct_location = None if self.reached_edge else path[-1]
+        self.length = len(path) - 1
+
+    def __repr__(self):
+        if self.reached_edge:
+            return "PathResult(reaches edge at {} in {} steps)".format(self.path[-1], self.length)
+        return "PathResult(self destructs at {} after {} steps)".format(self.self_destruct_location, self.length)
+
+class PathField:
+    """Tracks the paths of several units towards one edge, and updates them as single tiles are blocked or unblocked
+
+    Create one with GameState.create_path_field or ShortestPathFinder.create_field. Changing the field
+    does not change the game map, so it can be used to try out firewall placements.
 
     Attributes:
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a firewall at this node's location
-        * pathlength: The distance between this node and the target location
+        * game_state (:obj: GameState): The gamestate the field was created from
+        * end_points: The end points the units are pathing to
+        * blocked (bytearray): The firewall layout the paths are computed for. A private copy of the game map's blocked_mask
+        * pathlength (array): The distance between each location and the nearest end point, -1 if it cannot reach one
+        * paths (dict): The current path of each tracked unit, keyed on its start location as an (x, y) tuple. None if the start is blocked
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, pathfinder, game_state, end_points):
+        self._pathfinder = pathfinder
+        self.game_state = game_state
+        self.end_points = end_points
+        self.blocked = bytearray(game_state.game_map.blocked_mask)
+        self.pathlength = None
+        self.paths = {}
+
+    def set_blocked(self, location, blocked=True):
+        """Blocks or unblocks a location, as if a firewall was placed there or removed.
+        Only the part of the distance field affected by the change is recomputed.
+
+        Args:
+            * location: The location that changed
+            * blocked: True if there is now a firewall at location, False if it is now empty
+
+        Returns:
+            A list of the start locations whose paths changed
+
+        """
+        return self._pathfinder.update_field(self, location, blocked)
+
+# Shared by every ShortestPathFinder that is not given its own cache, so paths are reused across turns
+default_path_cache = PathCache()
+
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +176,42 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles pathfinding
 
+    Pathfinding state is kept in flat arrays indexed by ``x * ARENA_SIZE + y``.
+    The arrays are allocated once and reset in bulk between searches.
+
     Attributes:
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): 1 where there is a firewall at the location. This is the blocked_mask of the current GameMap
+        * visited_idealness (bytearray): 1 where the idealness search step has visited the location
+        * visited_validate (bytearray): 1 where the validation step has visited the location
+        * pathlength (array): The distance between each location and the target location, -1 if unknown
+        * neighbors (tuple): For each index, a tuple of the indices of the adjacent locations inside the arena. See game_map.NEIGHBORS
+        * coordinates (tuple): For each index, the (x, y) location it represents. See game_map.COORDINATES
+        * path_cache (:obj: PathCache): The cache of previously computed paths
 
     """
-    def __init__(self):
+    def __init__(self, path_cache=None):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.size = 0
+        self.path_cache = default_path_cache if path_cache is None else path_cache
+
+    def _allocate(self, size):
+        """Allocates the flat state arrays for a size x size arena
+        """
+        self.size = size
+        tiles = size * size
+        self._clear = bytes(tiles)
+        self._unknown_pathlength = array('h', [-1]) * tiles
+        self.visited_idealness = bytearray(tiles)
+        self.visited_validate = bytearray(tiles)
+        self.pathlength = array('h', self._unknown_pathlength)
+        self.coordinates = COORDINATES
+        self.neighbors = NEIGHBORS
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -50,7 +222,13 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        if self.size != self.game_state.ARENA_SIZE:
+            self._allocate(self.game_state.ARENA_SIZE)
+        else:
+            self.visited_idealness[:] = self._clear
+            self.visited_validate[:] = self._clear
+            self.pathlength[:] = self._unknown_pathlength
+        self.blocked = self.game_state.game_map.blocked_mask
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,52 +246,396 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
+        key = self._cache_key(start_point, end_points, game_state)
+        path = self.path_cache.get(key)
+        if path is not None:
+            return path
+
+        #Initialize map, walls are read from the game map's blocked_mask
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
         #Do pathfinding
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
+        path = self._get_path(start_point, end_points)
+        self.path_cache.put(key, path)
+        return path
+
+    def navigate_to_result(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints, and whether it gets there
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A PathResult, or None if start_point is blocked
 
-    def _idealness_search(self, start, end_points):
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
-        The edge if it is available, or the best self destruct location otherwise
+        path = self.navigate_multiple_endpoints(start_point, end_points, game_state)
+        if path is None:
+            return None
+        return PathResult(path, end_points)
+
+    def navigate_to_each_edge(self, start_point, edges_end_points, game_state):
+        """Finds the paths a unit would take to reach each of several sets of endpoints
+
+        The pocket of pathable space around start_point is the same whichever edge the unit targets,
+        so it is flood filled once and only the validation step is repeated for each set of endpoints.
+
+        Args:
+            * start_point: The starting location of the unit
+            * edges_end_points: A list of sets of end points, each should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path to each set of end points, in the same order as edges_end_points.
+            Every entry is None if start_point is blocked.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return [None] * len(edges_end_points)
+
+        paths = []
+        pocket = None
+        for end_points in edges_end_points:
+            key = self._cache_key(start_point, end_points, game_state)
+            path = self.path_cache.get(key)
+            if path is None:
+                if pocket is None:
+                    self.initialize_map(game_state)
+                    pocket = self._flood_pocket(start_point)
+                else:
+                    self.visited_validate[:] = self._clear
+                    self.pathlength[:] = self._unknown_pathlength
+                ideal_tile = self._most_ideal(pocket, end_points)
+                self._validate(ideal_tile, end_points)
+                path = self._get_path(start_point, end_points)
+                self.path_cache.put(key, path)
+            paths.append(path)
+        return paths
+
+    def _cache_key(self, start_point, end_points, game_state):
+        """The path_cache key for a path from start_point to end_points on the current firewall layout
+        """
+        return ((start_point[0], start_point[1]), tuple((x, y) for x, y in end_points), game_state.game_map.blocked_hash)
+
+    def navigate_multiple_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach a set of endpoints
+
+        The distance field computed by the validation step is shared by every start point in the
+        same pocket of pathable space, so it is only computed once per pocket.
+
+        Args:
+            * start_points: A list of starting locations
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each start point, in the same order as start_points.
+            The entry is None if the start point is blocked.
+
+        """
+        paths = []
+        fields = []
+        self.initialize_map(game_state)
+        for start_point in start_points:
+            if game_state.contains_stationary_unit(start_point):
+                paths.append(None)
+                continue
+
+            key = self._cache_key(start_point, end_points, game_state)
+            path = self.path_cache.get(key)
+            if path is not None:
+                paths.append(path)
+                continue
+
+            index = start_point[0] * self.size + start_point[1]
+            for field in fields:
+                #A start point is covered by a field if the validation step reached it
+                if not field[index] == -1:
+                    self.pathlength[:] = field
+                    break
+            else:
+                self.initialize_map(game_state)
+                ideal_endpoints = self._idealness_search(start_point, end_points)
+                self._validate(ideal_endpoints, end_points)
+                fields.append(array('h', self.pathlength))
+            path = self._get_path(start_point, end_points)
+            self.path_cache.put(key, path)
+            paths.append(path)
+        return paths
+
+    def create_field(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take, as a PathField that can be updated incrementally
+
+        Args:
+            * start_points: A list of starting locations
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A PathField tracking the path from each start point
+
+        """
+        self.initialize_map(game_state)
+        field = PathField(self, game_state, end_points)
+        self.blocked = field.blocked
+        #Validating from an end point seeds every end point, giving the distance field of every unit that can reach the edge
+        self._validate(end_points[0], end_points)
+        field.pathlength = array('h', self.pathlength)
+        for start_point in start_points:
+            field.paths[(start_point[0], start_point[1])] = self._field_path(field, start_point)
+        return field
+
+    def update_field(self, field, location, blocked):
+        """Blocks or unblocks a location in a PathField, repairing only the affected part of its distance field
+
+        Args:
+            * field: A PathField created by this pathfinder
+            * location: The location that changed
+            * blocked: True if there is now a firewall at location, False if it is now empty
+
+        Returns:
+            A list of the start locations whose paths changed
+
+        """
+        self.initialize_map(field.game_state)
+        self.blocked = field.blocked
+        index = location[0] * self.size + location[1]
+        blocked = 1 if blocked else 0
+        if field.blocked[index] == blocked:
+            return []
+
+        field.blocked[index] = blocked
+        end_indices = self._get_end_indices(field.end_points)
+        if blocked:
+            self._repair_blocked(field, index, end_indices)
+        else:
+            self._repair_unblocked(field, index, end_indices)
+
+        changed = []
+        for start_point, old_path in field.paths.items():
+            new_path = self._field_path(field, start_point)
+            if not new_path == old_path:
+                field.paths[start_point] = new_path
+                changed.append([start_point[0], start_point[1]])
+        return changed
+
+    def navigate_with_reroutes(self, start_point, end_points, game_state, unblock_events, speed=1):
+        """Simulates a unit moving towards a set of endpoints while firewalls in its way are destroyed
+
+        Units reroute mid round, so the unit takes a new path from its current location whenever a location opens up.
+        The distance field is kept in a PathField and only repaired around each location that opens up.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+            * unblock_events: A list of (frame, location) pairs, one for each firewall that is destroyed and the frame it is destroyed on.
+              A location that opens up on a frame affects the unit's moves from the next frame on
+            * speed: The speed of the unit, it moves once every 1/speed frames
+
+        Returns:
+            The location of the unit on each frame, starting with start_point on frame 0.
+            The last location is where the unit reaches the edge or self destructs. None if start_point is blocked.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        events = sorted(((frame, (location[0], location[1])) for frame, location in unblock_events), key=lambda event: event[0])
+        frames_per_move = max(1, int(round(1 / speed)))
+        field = self.create_field([], end_points, game_state)
+        path = self._field_path(field, start_point)
+        trajectory = [[start_point[0], start_point[1]]]
+        step = 1
+        next_event = 0
+        frame = 0
+        while True:
+            frame += 1
+            rerouted = False
+            while next_event < len(events) and events[next_event][0] < frame:
+                location = events[next_event][1]
+                next_event += 1
+                if field.blocked[location[0] * self.size + location[1]]:
+                    self.update_field(field, location, False)
+                    rerouted = True
+            if rerouted:
+                path = self._field_path(field, trajectory[-1])
+                step = 1
+
+            if frame % frames_per_move:
+                trajectory.append(trajectory[-1])
+                continue
+            if step >= len(path):
+                break
+            trajectory.append(path[step])
+            step += 1
+            if step >= len(path):
+                #The unit has reached the edge or self destructed, later events cannot move it
+                break
+        return trajectory
+
+    def _field_path(self, field, start_point):
+        """Gets the path from start_point using the distance field of a PathField
+        """
+        x, y = start_point
+        index = x * self.size + y
+        if field.blocked[index]:
+            return None
+        self.blocked = field.blocked
+        if field.pathlength[index] == -1:
+            #The unit cannot reach the edge, so it paths to the best self destruct location in its pocket
+            self.visited_idealness[:] = self._clear
+            self.visited_validate[:] = self._clear
+            self.pathlength[:] = self._unknown_pathlength
+            ideal_tile = self._idealness_search([x, y], field.end_points)
+            self._validate(ideal_tile, field.end_points)
+        else:
+            self.pathlength[:] = field.pathlength
+        return self._get_path([x, y], field.end_points)
+
+    def _repair_blocked(self, field, blocked_index, end_indices):
+        """Updates the distance field of a PathField after a location became blocked
+
+        Only locations whose every shortest route to the edge went through the location are recomputed.
+        """
+        pathlength = field.pathlength
+        blocked = field.blocked
+        neighbors = self.neighbors
+        affected = self.visited_validate
+        affected[blocked_index] = 1
+
+        #Find the locations that lost all of their shortest routes, in order of distance
+        changed = []
+        current = deque([blocked_index])
+        while current:
+            parent = current.popleft()
+            next_pathlength = pathlength[parent] + 1
+            for neighbor in neighbors[parent]:
+                if blocked[neighbor] or affected[neighbor] or not pathlength[neighbor] == next_pathlength or neighbor in end_indices:
+                    continue
+                if self._has_shortest_route(neighbor, pathlength, blocked, affected):
+                    continue
+                affected[neighbor] = 1
+                changed.append(neighbor)
+                current.append(neighbor)
+
+        if not blocked_index in end_indices:
+            pathlength[blocked_index] = -1
+        for index in changed:
+            pathlength[index] = -1
+
+        #Recompute the changed locations outwards from the unchanged part of the field
+        frontier = []
+        for index in changed:
+            best = -1
+            for neighbor in neighbors[index]:
+                if blocked[neighbor] or affected[neighbor] or pathlength[neighbor] == -1:
+                    continue
+                if best == -1 or pathlength[neighbor] < best:
+                    best = pathlength[neighbor]
+            if not best == -1:
+                heapq.heappush(frontier, (best + 1, index))
+
+        while frontier:
+            length, index = heapq.heappop(frontier)
+            if not pathlength[index] == -1:
+                continue
+            pathlength[index] = length
+            for neighbor in neighbors[index]:
+                if affected[neighbor] and not blocked[neighbor] and pathlength[neighbor] == -1:
+                    heapq.heappush(frontier, (length + 1, neighbor))
+
+    def _has_shortest_route(self, index, pathlength, blocked, affected):
+        """True if the location at index has an unaffected neighbor one step closer to the edge
+        """
+        target_pathlength = pathlength[index] - 1
+        for neighbor in self.neighbors[index]:
+            if not blocked[neighbor] and not affected[neighbor] and pathlength[neighbor] == target_pathlength:
+                return True
+        return False
+
+    def _repair_unblocked(self, field, unblocked_index, end_indices):
+        """Updates the distance field of a PathField after a location became unblocked
+
+        Distances can only get shorter, so they are propagated outwards from the location.
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
+        pathlength = field.pathlength
+        blocked = field.blocked
+        neighbors = self.neighbors
+        if not unblocked_index in end_indices:
+            best = -1
+            for neighbor in neighbors[unblocked_index]:
+                if blocked[neighbor] or pathlength[neighbor] == -1:
+                    continue
+                if best == -1 or pathlength[neighbor] < best:
+                    best = pathlength[neighbor]
+            if best == -1:
+                return
+            pathlength[unblocked_index] = best + 1
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        current = deque([unblocked_index])
+        while current:
+            parent = current.popleft()
+            next_pathlength = pathlength[parent] + 1
+            for neighbor in neighbors[parent]:
+                if blocked[neighbor] or neighbor in end_indices:
                     continue
+                if pathlength[neighbor] == -1 or pathlength[neighbor] > next_pathlength:
+                    pathlength[neighbor] = next_pathlength
+                    current.append(neighbor)
+
+    def _get_end_indices(self, end_points):
+        """The set of indices of a list of end points
+        """
+        return set(x * self.size + y for x, y in end_points)
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+    def _idealness_search(self, start, end_points):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space. 
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        return self._most_ideal(self._flood_pocket(start), end_points)
 
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
-                    most_ideal = neighbor
+    def _flood_pocket(self, start):
+        """Finds every location in the 'pocket' of pathable space around start, marking them in visited_idealness
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+        Returns:
+            A list of the indices of the locations in the pocket, in the order they were reached
+        """
+        blocked = self.blocked
+        visited = self.visited_idealness
+        neighbors = self.neighbors
 
-        return most_ideal
+        start_index = start[0] * self.size + start[1]
+        visited[start_index] = 1
+        pocket = [start_index]
+        current = deque(pocket)
+        while current:
+            search_index = current.popleft()
+            for neighbor in neighbors[search_index]:
+                if not blocked[neighbor] and not visited[neighbor]:
+                    visited[neighbor] = 1
+                    pocket.append(neighbor)
+                    current.append(neighbor)
+        return pocket
 
-    def _get_neighbors(self, location):
-        """Get the locations adjacent to a location
+    def _most_ideal(self, pocket, end_points):
+        """The most ideal location in a pocket for units pathing to end_points
         """
-        x, y = location
-        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+        end_indices = self._get_end_indices(end_points)
+        direction = self._get_direction_from_endpoints(end_points)
+
+        most_ideal = pocket[0]
+        best_idealness = self._get_idealness(most_ideal, end_indices, direction)
+        for index in pocket:
+            current_idealness = self._get_idealness(index, end_indices, direction)
+            if current_idealness > best_idealness:
+                best_idealness = current_idealness
+                most_ideal = index
+        return list(self.coordinates[most_ideal])
 
     def _get_direction_from_endpoints(self, end_points):
         """Prints a message to the games debug output
@@ -134,27 +656,26 @@ class ShortestPathFinder:
             direction[1] = -1
         return direction
 
-    def _get_idealness(self, location, end_points):
+    def _get_idealness(self, index, end_indices, direction):
         """Get the idealness of a tile, the reachable tile the unit most wants to path to.
         Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
 
         Returns:
             A location the unit will attempt to reach
         """
-        if location in end_points:
+        if index in end_indices:
             return sys.maxsize
 
-        direction = self._get_direction_from_endpoints(end_points)
-
+        x, y = self.coordinates[index]
         idealness = 0
         if direction[1] == 1:
-            idealness += 28 * location[1]
+            idealness += 28 * y
         else: 
-            idealness += 28 * (27 - location[1])
+            idealness += 28 * (27 - y)
         if direction[0] == 1:
-            idealness += location[0]
+            idealness += x
         else: 
-            idealness += (27 - location[0])
+            idealness += (27 - x)
 
         return idealness
 
@@ -162,33 +683,39 @@ class ShortestPathFinder:
         """Breadth first search of the grid, setting the pathlengths of each node
 
         """
+        size = self.size
+        blocked = self.blocked
+        visited = self.visited_validate
+        pathlength = self.pathlength
+        neighbors = self.neighbors
+
         #VALDIATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
+        current = deque()
         if ideal_tile in end_points:
             for location in end_points:
-               current.put(location)
+               index = location[0] * size + location[1]
+               current.append(index)
                #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
+               pathlength[index] = 0
+               visited[index] = 1
         else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+            index = ideal_tile[0] * size + ideal_tile[1]
+            current.append(index)
+            pathlength[index] = 0
+            visited[index] = 1
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
+        while current:
+            current_index = current.popleft()
+            if blocked[current_index]:
+                continue
+            next_pathlength = pathlength[current_index] + 1
+            for neighbor in neighbors[current_index]:
+                if not blocked[neighbor] and not visited[neighbor]:
+                    pathlength[neighbor] = next_pathlength
+                    visited[neighbor] = 1
+                    current.append(neighbor)
 
         #debug_write("Print after validate")
         #self.print_map()
@@ -199,41 +726,46 @@ class ShortestPathFinder:
 
         """
         #GET THE PATH
+        size = self.size
+        pathlength = self.pathlength
+        direction = self._get_direction_from_endpoints(end_points)
         path = [start_point]
-        current = start_point
+        current = start_point[0] * size + start_point[1]
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
+        while not pathlength[current] == 0:
+            #debug_write("current tile {} has cost {}".format(self.coordinates[current], pathlength[current]))
+            next_move = self._choose_next_move(current, move_direction, direction)
+            #debug_write(self.coordinates[next_move])
 
-            if current[0] == next_move[0]:
+            if current // size == next_move // size:
                 move_direction = self.VERTICAL
             else:
                 move_direction = self.HORIZONTAL
-            path.append(next_move)
+            path.append(list(self.coordinates[next_move]))
             current = next_move
         
         #debug_write(path)
         return path
   
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
+    def _choose_next_move(self, current_index, previous_move_direction, direction):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
+        blocked = self.blocked
+        pathlength = self.pathlength
+        coordinates = self.coordinates
+        current_point = coordinates[current_index]
+        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, self.neighbors[current_index]))
 
-        ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        ideal_neighbor = current_index
+        best_pathlength = pathlength[current_index]
+        for neighbor in self.neighbors[current_index]:
+            #debug_write("Comparing champ {} and contender {}".format(coordinates[ideal_neighbor], coordinates[neighbor]))
+            if blocked[neighbor]:
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = pathlength[neighbor]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
@@ -243,16 +775,16 @@ class ShortestPathFinder:
                 new_best = True
 
             #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+            if not new_best and not self._better_direction(current_point, coordinates[neighbor], coordinates[ideal_neighbor], previous_move_direction, direction):
                 continue
 
             ideal_neighbor = neighbor
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
+        #debug_write("Gave unit at {} new tile {}".format(current_point, coordinates[ideal_neighbor]))
         return ideal_neighbor
 
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
         """Compare two tiles and return True if the unit would rather move to the new one
 
         """
@@ -274,7 +806,6 @@ class ShortestPathFinder:
             return True
         
         #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
         if new_tile[1] == prev_best[1]: #If they both moved horizontal...
             if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
                 return True 
@@ -297,20 +828,215 @@ class ShortestPathFinder:
             debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
             return
 
-        for y in range(28):
-            for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+        for y in range(self.size):
+            row = []
+            for x in range(self.size):
+                index = x * self.size + (self.size - y - 1)
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    row.append(self._print_justified(self.pathlength[index]))
                 else:
-                    sys.stderr.write("   ")
-            debug_write("")
+                    row.append("   ")
+            #Written a row at a time since debug output is buffered. The bar keeps leading spaces from being stripped
+            debug_write("|" + "".join(row))
 
     def _print_justified(self, number):
-        """Prints a number between 100 and -10 in 3 spaces
+        """Justifies a number between 100 and -10 in 3 spaces
+
+        """
+        return "{:>2} ".format(number)
+
+
+class NumpyShortestPathFinder(ShortestPathFinder):
+    """Handles pathfinding with NumPy
+
+    The idealness and validation steps are computed for the whole board at once, by growing boolean masks
+    of the reached locations one step at a time. Paths are then extracted with the same tie-breaking rules
+    as ShortestPathFinder, so both give identical paths. Array operations only pay off when many boards
+    are searched together, see navigate_layouts and edge_distance_fields.
+
+    If NumPy is not installed every method falls back to the pure Python ShortestPathFinder.
+
+    Attributes:
+        * numpy_available (bool): Whether NumPy could be imported. NumPy is imported when the first NumpyShortestPathFinder is created
+
+    """
+    def __init__(self, path_cache=None):
+        super().__init__(path_cache)
+        self.numpy_available = _import_numpy()
+        if self.numpy_available:
+            self._in_arena = np.frombuffer(IN_ARENA, dtype=np.uint8).reshape(ARENA_SIZE, ARENA_SIZE).astype(bool)
+
+    def navigate_layouts(self, start_point, end_points, blocked_masks, game_state):
+        """Finds the path a unit would take on each of several firewall layouts
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * blocked_masks: A list of firewall layouts, each a bytearray like GameMap.blocked_mask
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each layout, in the same order as blocked_masks.
+            The entry is None if the start point is blocked in that layout.
+
+        """
+        self.initialize_map(game_state)
+        start_index = start_point[0] * self.size + start_point[1]
+        if not self.numpy_available:
+            paths = []
+            for blocked_mask in blocked_masks:
+                self.initialize_map(game_state)
+                self.blocked = blocked_mask
+                if blocked_mask[start_index]:
+                    paths.append(None)
+                    continue
+                ideal_endpoints = self._idealness_search(start_point, end_points)
+                self._validate(ideal_endpoints, end_points)
+                paths.append(self._get_path(start_point, end_points))
+            return paths
+
+        blocked = np.frombuffer(b"".join(bytes(blocked_mask) for blocked_mask in blocked_masks), dtype=np.uint8)
+        blocked = blocked.reshape(len(blocked_masks), self.size, self.size).astype(bool)
+        open_locations = self._in_arena & ~blocked
+        starts = np.zeros_like(blocked)
+        starts[:, start_point[0], start_point[1]] = True
+        pockets = self._flood_fill(open_locations, starts)
+
+        #Units whose pocket contains an end point path to the edge, the rest to their most ideal location
+        end_mask = self._location_mask(end_points)
+        reaches_edge = (pockets & end_mask).any(axis=(1, 2))
+        idealness = np.where(pockets, self._idealness_grid(end_points), -1)
+        most_ideal = idealness.reshape(len(blocked_masks), -1).argmax(axis=1)
+        seeds = np.zeros_like(blocked)
+        seeds[reaches_edge] = end_mask
+        for layout in np.flatnonzero(~reaches_edge):
+            seeds[layout].flat[most_ideal[layout]] = True
+        fields = self._distance_fields(open_locations, seeds)
+
+        paths = []
+        for layout, blocked_mask in enumerate(blocked_masks):
+            if blocked_mask[start_index]:
+                paths.append(None)
+                continue
+            self.blocked = blocked_mask
+            self.pathlength[:] = array('h', fields[layout].tobytes())
+            paths.append(self._get_path(start_point, end_points))
+        return paths
+
+    def edge_distance_fields(self, game_state, edges=None):
+        """Computes the distance between every location and each edge, for units that can reach that edge
+
+        Args:
+            * game_state: The current game state
+            * edges: A list of edges, game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. All four edges if None.
+
+        Returns:
+            A list with an array('h') for each edge, indexed like pathlength. -1 where the edge cannot be reached.
+
+        """
+        self.initialize_map(game_state)
+        if edges is None:
+            edges = [game_state.game_map.TOP_RIGHT, game_state.game_map.TOP_LEFT, game_state.game_map.BOTTOM_LEFT, game_state.game_map.BOTTOM_RIGHT]
+        edge_locations = [game_state.game_map.get_edge_locations(edge) for edge in edges]
+        if not self.numpy_available:
+            fields = []
+            for end_points in edge_locations:
+                self.initialize_map(game_state)
+                self._validate(end_points[0], end_points)
+                fields.append(array('h', self.pathlength))
+            return fields
+
+        blocked = np.frombuffer(bytes(self.blocked), dtype=np.uint8).reshape(self.size, self.size).astype(bool)
+        open_locations = np.broadcast_to(self._in_arena & ~blocked, (len(edges), self.size, self.size))
+        seeds = np.array([self._location_mask(end_points) for end_points in edge_locations])
+        fields = self._distance_fields(open_locations, seeds)
+        return [array('h', field.tobytes()) for field in fields]
+
+    def _idealness_search(self, start, end_points):
+        """Finds the most ideal tile in our 'pocket' of pathable space, using a flood fill of the whole board
+        """
+        if not self.numpy_available:
+            return super()._idealness_search(start, end_points)
+
+        blocked = np.frombuffer(bytes(self.blocked), dtype=np.uint8).reshape(self.size, self.size).astype(bool)
+        starts = np.zeros((self.size, self.size), dtype=bool)
+        starts[start[0], start[1]] = True
+        pocket = self._flood_fill(self._in_arena & ~blocked, starts)
+        self.visited_idealness[:] = pocket.astype(np.uint8).tobytes()
+
+        end_mask = self._location_mask(end_points)
+        if (pocket & end_mask).any():
+            return list(self.coordinates[int(np.flatnonzero(pocket & end_mask)[0])])
+        idealness = np.where(pocket, self._idealness_grid(end_points), -1)
+        return list(self.coordinates[int(idealness.argmax())])
+
+    def _validate(self, ideal_tile, end_points):
+        """Sets the pathlengths of each node, growing the reached locations outwards from the ideal tiles one step at a time
+        """
+        if not self.numpy_available:
+            return super()._validate(ideal_tile, end_points)
+
+        blocked = np.frombuffer(bytes(self.blocked), dtype=np.uint8).reshape(self.size, self.size).astype(bool)
+        if ideal_tile in end_points:
+            seeds = self._location_mask(end_points)
+        else:
+            seeds = self._location_mask([ideal_tile])
+        field = self._distance_fields(self._in_arena & ~blocked, seeds)
+        self.pathlength[:] = array('h', field.tobytes())
+        self.visited_validate[:] = (field >= 0).astype(np.uint8).tobytes()
+
+    def _location_mask(self, locations):
+        """A boolean board that is True at each of the given locations
+        """
+        mask = np.zeros((self.size, self.size), dtype=bool)
+        for x, y in locations:
+            mask[x, y] = True
+        return mask
+
+    def _idealness_grid(self, end_points):
+        """The idealness of every location on the board for units pathing to end_points, ignoring that end points are perfectly ideal
+        """
+        direction = self._get_direction_from_endpoints(end_points)
+        x = np.arange(self.size).reshape(self.size, 1)
+        y = np.arange(self.size).reshape(1, self.size)
+        if direction[0] == -1:
+            x = 27 - x
+        if direction[1] == -1:
+            y = 27 - y
+        return 28 * y + x
+
+    def _spread(self, mask):
+        """Grows boolean boards by one step in each direction
+        """
+        grown = np.zeros_like(mask)
+        grown[..., :, 1:] |= mask[..., :, :-1]
+        grown[..., :, :-1] |= mask[..., :, 1:]
+        grown[..., 1:, :] |= mask[..., :-1, :]
+        grown[..., :-1, :] |= mask[..., 1:, :]
+        return grown
+
+    def _flood_fill(self, open_locations, starts):
+        """The open locations connected to the starts, for one board or a stack of boards
+        """
+        reached = starts & open_locations
+        frontier = reached
+        while frontier.any():
+            frontier = self._spread(frontier) & open_locations & ~reached
+            reached |= frontier
+        return reached
 
+    def _distance_fields(self, open_locations, seeds):
+        """The pathlength of every location from the seeds, for one board or a stack of boards.
+        Seeds that are blocked get a pathlength of 0 but are not expanded, like in ShortestPathFinder._validate
         """
-        if number < 10 and number > -1:
-            sys.stderr.write(" ")
-        sys.stderr.write(str(number))
-        sys.stderr.write(" ")
+        fields = np.full(seeds.shape, -1, dtype=np.int16)
+        fields[seeds] = 0
+        reached = seeds.copy()
+        frontier = seeds & open_locations
+        pathlength = 0
+        while frontier.any():
+            pathlength += 1
+            frontier = self._spread(frontier) & open_locations & ~reached
+            fields[frontier] = pathlength
+            reached |= frontier
+        return fields
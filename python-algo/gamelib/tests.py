@@ -1,7 +1,21 @@
 import unittest
 import json
+import io
+import copy
+import pickle
+import sys
+import queue
+import time
+import random
+import threading
 from .game_state import GameState
 from .unit import GameUnit
+from .navigation import ShortestPathFinder, NumpyShortestPathFinder, PathCache
+from .util import send_command, DebugLog, DEBUG, INFO, ERROR
+from . import bench
+from .algocore import AlgoCore, message_type
+from .frame_parser import parse_frame_events
+from .deadline import Deadline, turn_deadline
 from .advanced_game_state import AdvancedGameState
 
 class BasicTests(unittest.TestCase):
@@ -186,10 +200,26 @@ class BasicTests(unittest.TestCase):
             game.game_map.add_unit("FF", [13,13])
         self.assertEqual(1, len(game.game_map[13,13]), "Towers seem to be stacking")
         
+    def test_map_iteration(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        locations = list(game.game_map)
+        self.assertEqual(420, len(locations), "The arena should have 420 locations")
+        self.assertEqual([13, 0], locations[0], "Iteration should start at the bottom of the arena")
+        self.assertEqual([14, 27], locations[-1], "Iteration should end at the top of the arena")
+        self.assertTrue(all(game.game_map.in_arena_bounds(location) for location in locations), "Iterated over a location outside the arena")
+        self.assertEqual(420 * 420, sum(1 for _ in game.game_map for _ in game.game_map), "Nested iteration over the map should work")
+
     def test_get_units_in_range(self, adv=False):
         game = self.make_turn_0_map(adv)
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3)), "Wrong number of tiles in range")
+        for location in [[13, 0], [0, 13], [20, 10]]:
+            expected = [[x, y] for x, y in game.game_map if game.game_map.distance_between_locations(location, [x, y]) < 3.51]
+            self.assertEqual(sorted(expected), game.game_map.get_locations_in_range(location, 3), "Wrong tiles in range of {}".format(location))
+        self.assertIn([13, 14], game.game_map.get_locations_in_range([13, 13], 1), "Locations in range should be [x, y] lists like the rest of the map")
+        in_range = game.game_map.get_locations_in_range([20, 10], 3)
+        in_range.clear()
+        self.assertEqual(37, len(game.game_map.get_locations_in_range([20, 10], 3)), "Changing a result should not change later results")
 
     def _test_get_attackers(self):
         game = self.make_turn_0_map(True)
@@ -207,6 +237,584 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_find_path_to_edge(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([13, 0], path[0], "Path should begin at the start location")
+        self.assertEqual([27, 14], path[-1], "Path should end on the top right edge")
+        self.assertEqual(29, len(path), "Wrong path length on an empty board")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Repeated pathing should give the same path")
+        for x in range(12, 16):
+            game.game_map.add_unit("FF", [x, 3], 0)
+        blocked_path = game.find_path_to_edge([13, 0])
+        self.assertNotIn([13, 3], blocked_path, "Path should avoid firewalls")
+        self.assertIn(blocked_path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Path should still reach the edge")
+        for x in range(12, 16):
+            game.game_map.add_unit("FF", [x, 2], 0)
+        trapped_path = game.find_path_to_edge([13, 0])
+        self.assertNotIn(trapped_path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "A trapped unit cannot reach the edge")
+
+    def test_find_path_result(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        result = game.find_path_result([13, 0])
+        self.assertEqual(game.find_path_to_edge([13, 0]), result.path, "The result should hold the same path")
+        self.assertTrue(result.reached_edge, "A unit on an empty map should reach the edge")
+        self.assertIsNone(result.self_destruct_location, "A unit that reaches the edge should not self destruct")
+        self.assertEqual(len(result.path) - 1, result.length, "Wrong path length")
+
+        for x in range(12, 16):
+            game.game_map.add_unit("FF", [x, 2], 0)
+        result = game.find_path_result([13, 0])
+        self.assertFalse(result.reached_edge, "A trapped unit should not reach the edge")
+        self.assertEqual(result.path[-1], result.self_destruct_location, "A trapped unit should self destruct at the end of its path")
+        self.assertIsNone(game.find_path_result([12, 2]), "Pathing from a blocked location should give None")
+
+    def test_find_path_to_each_edge(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        for x in range(12, 16):
+            game.game_map.add_unit("FF", [x, 3], 0)
+        for start in [[13, 0], [13, 2], [20, 8]]:
+            paths = game.find_path_to_each_edge(start)
+            self.assertEqual(4, len(paths), "There should be a path to each edge")
+            for edge, path in enumerate(paths):
+                self.assertEqual(game.find_path_to_edge(start, edge), path, "Path from {} to edge {} differs".format(start, edge))
+        top_edges = [game.game_map.TOP_LEFT, game.game_map.TOP_RIGHT]
+        paths = game.find_path_to_each_edge([13, 0], top_edges)
+        self.assertEqual([game.find_path_to_edge([13, 0], edge) for edge in top_edges], paths, "Paths should follow the order of target_edges")
+        self.assertIsNone(game.find_path_to_each_edge([13, 3]), "Pathing from a blocked location should give None")
+
+    def test_find_paths_to_edge(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        for x in range(10, 18):
+            game.game_map.add_unit("FF", [x, 6], 0)
+        for x in range(12, 16):
+            game.game_map.add_unit("FF", [x, 2], 0)
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT) + [[13, 6]]
+        paths = game.find_paths_to_edge(starts)
+        self.assertEqual(len(starts), len(paths), "There should be one path per start location")
+        self.assertIsNone(paths[-1], "Pathing from a blocked location should give None")
+        for start, path in zip(starts[:-1], paths[:-1]):
+            self.assertEqual(game.find_path_to_edge(start), path, "Batched path from {} differs".format(start))
+        self.assertEqual(game.find_path_to_edge([13, 0], game.game_map.TOP_LEFT), game.find_paths_to_edge([[13, 0]], game.game_map.TOP_LEFT)[0], "Explicit target edge is ignored")
+
+    def test_path_cache(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        cache = PathCache(2)
+        game._shortest_path_finder = ShortestPathFinder(cache)
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual((0, 1), (cache.hits, cache.misses), "The first query should miss")
+        path.append([0, 0])
+        self.assertEqual(path[:-1], game.find_path_to_edge([13, 0]), "Cached paths should not be changed by callers")
+        self.assertEqual((1, 1), (cache.hits, cache.misses), "The second query should hit")
+        empty_hash = game.game_map.blocked_hash
+        game.game_map.add_unit("FF", [13, 1], 0)
+        self.assertNotEqual(empty_hash, game.game_map.blocked_hash, "Adding a firewall should change the hash")
+        self.assertNotIn([13, 1], game.find_path_to_edge([13, 0]), "A stale path was returned after adding a firewall")
+        self.assertEqual((1, 2), (cache.hits, cache.misses), "Adding a firewall should invalidate the cached path")
+        game.game_map.remove_unit([13, 1])
+        self.assertEqual(empty_hash, game.game_map.blocked_hash, "Removing a firewall should restore the hash")
+        game.find_path_to_edge([13, 0])
+        game.find_path_to_edge([14, 0])
+        self.assertEqual(2, len(cache), "The cache should not grow beyond its size")
+
+    def test_copy_after_path_query(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        path = game.find_path_to_edge([13, 0])
+        copied = copy.deepcopy(game)
+        self.assertIs(game._shortest_path_finder.path_cache, copied._shortest_path_finder.path_cache, "Copies should share the path cache")
+        self.assertEqual(path, copied.find_path_to_edge([13, 0]), "The copy should find the same path")
+        unpickled = pickle.loads(pickle.dumps(game))
+        self.assertEqual(path, unpickled.find_path_to_edge([13, 0]), "The unpickled state should find the same path")
+
+    def test_path_field(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        starts = [[13, 0], [14, 0], [10, 3], [20, 6]]
+        field = game.create_path_field(starts, game.game_map.TOP_RIGHT)
+        for start in starts:
+            self.assertEqual(game.find_path_to_edge(start, game.game_map.TOP_RIGHT), field.paths[tuple(start)], "Field path from {} differs".format(start))
+
+        wall = [[x, 3] for x in range(11, 17)] + [[12, 2], [13, 2], [14, 2], [15, 2]]
+        for location in wall:
+            changed = field.set_blocked(location)
+            game.game_map.add_unit("FF", location, 0)
+            for start in starts:
+                self.assertEqual(game.find_path_to_edge(start, game.game_map.TOP_RIGHT), field.paths[tuple(start)], "Repaired path from {} differs".format(start))
+        self.assertEqual([], field.set_blocked(wall[0]), "Blocking a blocked location should change nothing")
+        self.assertNotIn(field.paths[(13, 0)][-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "The unit at [13, 0] should be trapped")
+
+        changed = field.set_blocked([13, 2], False)
+        game.game_map.remove_unit([13, 2])
+        self.assertIn([13, 0], changed, "Opening the pocket should change the trapped path")
+        self.assertNotIn([20, 6], changed, "Opening the pocket should not change an unrelated path")
+        for start in starts:
+            self.assertEqual(game.find_path_to_edge(start, game.game_map.TOP_RIGHT), field.paths[tuple(start)], "Repaired path from {} differs".format(start))
+
+    def test_rerouted_path(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        top_right = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+        self.assertEqual(game.find_path_to_edge([13, 0]), game.find_rerouted_path([13, 0], []), "Without events the unit should follow its path")
+
+        wall = [[x, 2] for x in range(11, 17)]
+        for location in wall:
+            game.game_map.add_unit("FF", location, 0)
+        trapped = game.find_path_to_edge([13, 0])
+        self.assertEqual(trapped, game.find_rerouted_path([13, 0], [(2, [20, 10])]), "Opening an empty location should not reroute the unit")
+
+        trajectory = game.find_rerouted_path([13, 0], [(1, [14, 2])])
+        self.assertEqual(trapped[:3], trajectory[:3], "The unit should follow its path until the location opens up")
+        self.assertIn(trajectory[-1], top_right, "The unit should reroute through the opening and reach the edge")
+        self.assertIn([14, 2], trajectory, "The unit should move through the opening")
+        for previous, current in zip(trajectory, trajectory[1:]):
+            self.assertEqual(1, abs(previous[0] - current[0]) + abs(previous[1] - current[1]), "The unit should move one location per frame")
+        self.assertTrue(game.game_map[14, 2], "The game map should not change")
+
+        slow = game.find_rerouted_path([13, 0], [(9, [14, 2])], unit_type="EI")
+        self.assertEqual(trapped[:3], slow[:9:4], "A unit with speed 0.25 should move every 4 frames")
+        self.assertIn(slow[-1], top_right, "The slow unit should reroute too")
+
+        arrived = game.find_rerouted_path([13, 0], [], unit_type="SI")
+        self.assertEqual(4 * (len(trapped) - 1) + 1, len(arrived), "The trajectory should end on the frame the unit arrives")
+        late = game.find_rerouted_path([13, 0], [(len(arrived), [14, 2])], unit_type="SI")
+        self.assertEqual(arrived, late, "A unit that already self destructed should not reroute")
+
+    def test_numpy_pathfinder(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        rng = random.Random(5)
+        for location in game.game_map:
+            if rng.random() < 0.3:
+                game.game_map.add_unit("FF", location, 0)
+        layouts = []
+        for _ in range(5):
+            layout = bytearray(game.game_map.blocked_mask)
+            for location in game.game_map:
+                if rng.random() < 0.1:
+                    layout[location[0] * game.ARENA_SIZE + location[1]] ^= 1
+            layouts.append(layout)
+
+        python_finder = ShortestPathFinder(PathCache(0))
+        for numpy_available in [True, False]:
+            numpy_finder = NumpyShortestPathFinder(PathCache(0))
+            numpy_finder.numpy_available = numpy_finder.numpy_available and numpy_available
+            for edge in range(4):
+                end_points = game.game_map.get_edge_locations(edge)
+                for start in list(game.game_map)[::7]:
+                    expected = python_finder.navigate_multiple_endpoints(start, end_points, game)
+                    self.assertEqual(expected, numpy_finder.navigate_multiple_endpoints(start, end_points, game), "Paths from {} differ".format(start))
+
+                start = [13, 27] if edge > 1 else [13, 0]
+                expected = []
+                for layout in layouts:
+                    python_finder.initialize_map(game)
+                    python_finder.blocked = layout
+                    if layout[start[0] * game.ARENA_SIZE + start[1]]:
+                        expected.append(None)
+                        continue
+                    ideal_tile = python_finder._idealness_search(start, end_points)
+                    python_finder._validate(ideal_tile, end_points)
+                    expected.append(python_finder._get_path(start, end_points))
+                self.assertEqual(expected, numpy_finder.navigate_layouts(start, end_points, layouts, game), "Paths on hypothetical layouts differ")
+
+            fields = numpy_finder.edge_distance_fields(game)
+            for edge in range(4):
+                end_points = game.game_map.get_edge_locations(edge)
+                python_finder.initialize_map(game)
+                python_finder._validate(end_points[0], end_points)
+                self.assertEqual(python_finder.pathlength, fields[edge], "Distance field to edge {} differs".format(edge))
+
+    def test_pathfinding_benchmark(self, adv=False):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        start = [13, 0]
+        end_points = game_map.get_edge_locations(game_map.TOP_RIGHT)
+        repeats = 5
+
+        def queue_search():
+            #The search as it was before the deque rewrite: queue.Queue of [x, y] lists and bounds checked neighbors
+            visited = [[False] * game.ARENA_SIZE for _ in range(game.ARENA_SIZE)]
+            visited[start[0]][start[1]] = True
+            ideal_tile = start
+            current = queue.Queue()
+            current.put(start)
+            while not current.empty():
+                x, y = current.get()
+                for neighbor in [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]:
+                    if not game_map.in_arena_bounds(neighbor) or game.contains_stationary_unit(neighbor):
+                        continue
+                    if neighbor in end_points:
+                        ideal_tile = neighbor
+                    if not visited[neighbor[0]][neighbor[1]]:
+                        visited[neighbor[0]][neighbor[1]] = True
+                        current.put(neighbor)
+
+            pathlength = [[-1] * game.ARENA_SIZE for _ in range(game.ARENA_SIZE)]
+            current = queue.Queue()
+            for location in (end_points if ideal_tile in end_points else [ideal_tile]):
+                pathlength[location[0]][location[1]] = 0
+                current.put(location)
+            while not current.empty():
+                x, y = current.get()
+                for neighbor in [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]:
+                    if not game_map.in_arena_bounds(neighbor) or game.contains_stationary_unit(neighbor):
+                        continue
+                    if pathlength[neighbor[0]][neighbor[1]] == -1:
+                        pathlength[neighbor[0]][neighbor[1]] = pathlength[x][y] + 1
+                        current.put(neighbor)
+            return pathlength
+
+        finder = ShortestPathFinder(PathCache(0))
+        def deque_search():
+            finder.initialize_map(game)
+            finder._validate(finder._idealness_search(start, end_points), end_points)
+            return finder.pathlength
+
+        def best_time(search):
+            times = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                search()
+                times.append(time.perf_counter() - start_time)
+            return min(times)
+
+        expected = queue_search()
+        got = deque_search()
+        for x, y in game_map:
+            self.assertEqual(expected[x][y], got[x * game.ARENA_SIZE + y], "The searches disagree on the pathlength of {}".format([x, y]))
+        queue_time = best_time(queue_search)
+        deque_time = best_time(deque_search)
+        self.assertLess(deque_time, queue_time, "The deque search took {:.3f} ms per call, the queue.Queue search {:.3f} ms".format(deque_time * 1000, queue_time * 1000))
+
+    def test_bench_corpus(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        results = bench.run(game.config, ["wall", "trapped"], warmup=0, repeat=1)
+        self.assertEqual(8, len(results), "There should be a result for every edge of each layout")
+        for name, edge_name, result in results:
+            self.assertIsNotNone(result, "{} {} should have open spawn locations".format(name, edge_name))
+            self.assertLessEqual(result["p50"], result["p99"], "p50 should not be above p99")
+        self.assertEqual(3, bench.percentile([5, 1, 4, 2, 3], 50), "The median of 1 to 5 is 3")
+        fork = bench.benchmark_fork(game, repeat=5)
+        self.assertEqual(5, fork["calls"], "Every fork should be timed")
+        self.assertLessEqual(fork["p50"], fork["p99"], "p50 should not be above p99")
+
+    def test_blocked_mask(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        mask = game.game_map.blocked_mask
+        self.assertEqual(0, sum(mask), "An empty map should have no blocked tiles")
+        game.game_map.add_unit("EI", [13, 13])
+        self.assertEqual(0, mask[13 * game.ARENA_SIZE + 13], "Information units should not block")
+        game.game_map.add_unit("DF", [13, 13])
+        self.assertEqual(1, mask[13 * game.ARENA_SIZE + 13], "Firewalls should block")
+        game.attempt_spawn("FF", [[13, 5]])
+        self.assertEqual(1, mask[13 * game.ARENA_SIZE + 5], "Spawned firewalls should block")
+        game.game_map.remove_unit([13, 13])
+        self.assertEqual(0, mask[13 * game.ARENA_SIZE + 13], "Removed firewalls should not block")
+        self.assertEqual(1, sum(mask), "Only one tile should still be blocked")
+
+    def test_tile_index(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        game_map = game.game_map
+        index = 13 * game.ARENA_SIZE + 13
+        self.assertEqual(-1, game_map.owner[index], "An empty location should have no owner")
+        game_map.add_unit("PI", [13, 13], 0)
+        game_map.add_unit("PI", [13, 13], 1)
+        game_map.add_unit("EI", [13, 13], 0)
+        self.assertEqual(2, game_map.mobile_counts["PI"][index], "There should be two pings")
+        self.assertEqual(1, game_map.mobile_counts["EI"][index], "There should be one emp")
+        self.assertEqual(-1, game_map.firewall_type[index], "Information units are not firewalls")
+        game_map.add_unit("DF", [13, 13], 1)
+        self.assertEqual(1, game_map.owner[index], "The enemy should own the destructor")
+        self.assertEqual(game_map.unit_type_codes["DF"], game_map.firewall_type[index], "The firewall should be a destructor")
+        self.assertEqual(75, game_map.stability[index], "The destructor should have full stability")
+        self.assertEqual(0, game_map.mobile_counts["PI"][index], "Placing a firewall replaces the units on the location")
+        self.assertEqual(1, len(game.get_attackers([13, 12], 0)), "The destructor should attack our units")
+        self.assertEqual(0, len(game.get_attackers([13, 12], 1)), "The destructor should not attack its own units")
+        game_map.remove_unit([13, 13])
+        self.assertEqual(-1, game_map.owner[index], "Removing the firewall should clear the owner")
+        self.assertEqual(0, game_map.stability[index], "Removing the firewall should clear the stability")
+
+        state = """{"p2Units":[[],[],[[14,20,40.0,"3"]],[],[],[],[]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,5,60.0,"1"]],[],[],[[13,0,15.0,"2"],[13,0,15.0,"4"]],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+        parsed = GameState(game.config, state).game_map
+        self.assertEqual(0, parsed.owner[13 * game.ARENA_SIZE + 5], "We should own the parsed filter")
+        self.assertEqual(parsed.unit_type_codes["FF"], parsed.firewall_type[13 * game.ARENA_SIZE + 5], "The parsed firewall should be a filter")
+        self.assertEqual(40, parsed.stability[14 * game.ARENA_SIZE + 20], "The parsed destructor should keep its damaged stability")
+        self.assertEqual(2, parsed.mobile_counts["PI"][13 * game.ARENA_SIZE], "Both parsed pings should be counted")
+
+    def test_threat_map(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        rng = random.Random(3)
+        for location in game.game_map:
+            if rng.random() < 0.1:
+                game.game_map.add_unit(rng.choice(["DF", "DF", "FF"]), location, rng.randint(0, 1))
+        for player_index in [0, 1]:
+            attackers, damage = game.threat_map(player_index)
+            for x, y in game.game_map:
+                expected = len(game.get_attackers([x, y], player_index))
+                self.assertEqual(expected, attackers[x * game.ARENA_SIZE + y], "Wrong number of attackers at {}".format([x, y]))
+                self.assertEqual(expected * 4, damage[x * game.ARENA_SIZE + y], "Wrong damage at {}".format([x, y]))
+
+        self.assertIs(game.threat_map(0), game.threat_map(0), "The threat map should be cached")
+        game.game_map.add_unit("DF", [13, 20], 1)
+        attackers, _ = game.threat_map(0)
+        self.assertEqual(len(game.get_attackers([13, 18], 0)), attackers[13 * game.ARENA_SIZE + 18], "The threat map should update when a destructor is added")
+
+    def test_fork(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        game.game_map.add_unit("DF", [13, 20], 1)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        path = game.find_path_to_edge([13, 0])
+        threat = game.threat_map(0)
+
+        child = game.fork()
+        self.assertIs(type(game), type(child), "A fork should have the same type")
+        self.assertEqual(1, child.attempt_spawn("FF", [13, 1]), "The fork should be able to spawn")
+        self.assertEqual(1, child.attempt_spawn("PI", [14, 0]), "The fork should be able to deploy")
+        child.game_map.add_unit("PI", [13, 0], 0)
+        child.game_map.add_unit("DF", [14, 20], 1)
+        child.game_map.remove_unit([13, 20])
+
+        self.assertEqual(1, len(game.game_map[13, 0]), "Adding units to a fork should not change the parent")
+        self.assertEqual(0, len(game.game_map[14, 0]), "Deploying in a fork should not change the parent")
+        self.assertEqual(0, len(game.game_map[13, 1]), "Spawning in a fork should not change the parent")
+        self.assertEqual(1, len(game.game_map[13, 20]), "Removing units from a fork should not change the parent")
+        self.assertEqual(25, game.get_resource(game.CORES), "Spawning in a fork should not spend the parent's cores")
+        self.assertEqual(5, game.get_resource(game.BITS), "Deploying in a fork should not spend the parent's bits")
+        self.assertEqual([], game._build_stack, "The build stack should be private to the fork")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "The parent's path should not change")
+        self.assertIs(threat, game.threat_map(0), "The parent's threat map should still be cached")
+        self.assertNotEqual(path, child.find_path_to_edge([13, 0]), "The fork's path should go around the new filter")
+        self.assertEqual(len(child.get_attackers([14, 18], 0)), child.threat_map(0)[0][14 * child.ARENA_SIZE + 18], "The fork's threat map should follow its own destructors")
+        self.assertEqual(0, game.threat_map(0)[0][14 * game.ARENA_SIZE + 17] - len(game.get_attackers([14, 17], 0)), "The parent's threat map should follow its own destructors")
+
+    def test_checkpoint_rollback(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        game.game_map.add_unit("DF", [13, 20], 1)
+        game.attempt_spawn("FF", [13, 5])
+        path = game.find_path_to_edge([13, 0])
+        blocked_hash = game.game_map.blocked_hash
+        attackers = list(game.threat_map(0)[0])
+
+        checkpoint = game.checkpoint()
+        game.attempt_spawn("FF", [[12, 1], [13, 1], [14, 1], [15, 1]])
+        nested = game.checkpoint()
+        game.attempt_spawn("PI", [13, 0], 2)
+        game.attempt_remove([13, 5])
+        game.game_map.remove_unit([13, 20])
+        game.game_map.add_unit("DF", [14, 20], 1)
+        self.assertEqual(3, game.get_resource(game.BITS), "Deploying should spend bits")
+
+        game.rollback(nested)
+        self.assertEqual(5, game.get_resource(game.BITS), "Rolling back should refund bits")
+        self.assertEqual(0, len(game.game_map[13, 0]), "Rolling back should remove deployed units")
+        self.assertEqual(1, len(game.game_map[13, 20]), "Rolling back should restore removed units")
+        self.assertEqual(0, len(game.game_map[14, 20]), "Rolling back should remove added units")
+        self.assertEqual(5, len(game._build_stack), "Rolling back should only undo changes after the checkpoint")
+        self.assertEqual(attackers, list(game.threat_map(0)[0]), "Rolling back should restore the threat map")
+
+        game.rollback(checkpoint)
+        self.assertEqual(24, game.get_resource(game.CORES), "Rolling back should refund cores")
+        self.assertEqual([("FF", 13, 5)], game._build_stack, "Rolling back should restore the build stack")
+        self.assertEqual([], game._deploy_stack, "Rolling back should restore the deploy stack")
+        self.assertEqual(blocked_hash, game.game_map.blocked_hash, "Rolling back should restore the firewall layout")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Rolling back should restore paths")
+        self.assertIsNone(game.game_map._undo_log, "Changes should not be recorded after rolling back to the first checkpoint")
+
+        checkpoint = game.checkpoint()
+        game.attempt_spawn("FF", [13, 1])
+        nested = game.checkpoint()
+        game.attempt_spawn("FF", [14, 1])
+        game.commit(nested)
+        self.assertEqual(nested, len(game.game_map._undo_log) - 3, "Committing a nested checkpoint should keep its changes recorded")
+        game.commit(checkpoint)
+        self.assertIsNone(game.game_map._undo_log, "Committing the first checkpoint should stop recording")
+        game.attempt_spawn("FF", [15, 1])
+        self.assertEqual(4, len(game._build_stack), "Committed changes should be kept")
+        self.assertEqual(21, game.get_resource(game.CORES), "Committed spawns should stay paid for")
+
+    def test_unit_stats(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        game.game_map.add_unit("DF", [13, 5], 0)
+        game.game_map.add_unit("DF", [14, 5], 1)
+        game.game_map.add_unit("EF", [15, 5], 0)
+        game.game_map.add_unit("EI", [13, 0], 0)
+        destructor, other_destructor = game.game_map[13, 5][0], game.game_map[14, 5][0]
+        encryptor, emp = game.game_map[15, 5][0], game.game_map[13, 0][0]
+        self.assertIs(destructor.stats, other_destructor.stats, "Units of the same type should share their stats")
+        self.assertFalse(hasattr(destructor, "__dict__"), "Units should not have a __dict__")
+        self.assertEqual((True, 0, 4.0, 3.0, 75.0, 3), (destructor.stationary, destructor.speed, destructor.damage, destructor.range, destructor.max_stability, destructor.cost), "Wrong destructor stats")
+        self.assertEqual(10.0, encryptor.damage, "An encryptor's damage should be its shield amount")
+        self.assertEqual((False, 0.25, 3.0, 3.0), (emp.stationary, emp.speed, emp.damage_f, emp.damage_i), "Wrong emp stats")
+        self.assertIs(game.config, emp.config, "Units should keep a reference to the config")
+        destructor.stability = 10
+        self.assertEqual(75.0, other_destructor.stability, "Stability should belong to each unit")
+
+    def test_lazy_units(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        state = """{"p2Units":[[],[],[[14,20,40.0,"3"]],[],[],[],[]],"turnInfo":[0,4,-1],"p1Stats":[27.0,12.0,7.0,0],"p1Units":[[[13,5,60.0,"1"]],[],[],[[13,0,15.0,"2"]],[],[],[[13,5,60.0,"1"]]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+        eager = GameState(game.config, state)
+        lazy = GameState(game.config, state, lazy_units=True)
+        lazy.suppress_warnings(True)
+        self.assertEqual((4, 27.0, 12.0), (lazy.turn_number, lazy.my_health, lazy.get_resource(lazy.CORES)), "Turn info should be available straight away")
+        self.assertIsNotNone(lazy._pending_units, "Units should not be parsed before the map is used")
+        self.assertTrue(lazy.contains_stationary_unit([14, 20]), "Using the map should parse the units")
+        self.assertIsNone(lazy._pending_units, "Units should only be parsed once")
+        self.assertEqual(bytes(eager.game_map.blocked_mask), bytes(lazy.game_map.blocked_mask), "Lazy parsing should give the same firewalls")
+        self.assertTrue(lazy.game_map[13, 5][0].pending_removal, "Lazy parsing should mark removed firewalls")
+        self.assertEqual(1, len(lazy.game_map[13, 0]), "Lazy parsing should add information units")
+        self.assertEqual(eager.find_path_to_edge([13, 0]), GameState(game.config, state, lazy_units=True).find_path_to_edge([13, 0]), "Lazy parsing should give the same paths")
+
+    def test_decoded_state(self, adv=False):
+        game = self.make_turn_0_map(adv)
+        state = """{"p2Units":[[],[],[[14,20,40.0,"3"]],[],[],[],[]],"turnInfo":[0,4,-1],"p1Stats":[27.0,12.0,7.0,0],"p1Units":[[[13,5,60.0,"1"]],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        from_string = GameState(game.config, state)
+        from_dict = GameState(game.config, json.loads(state))
+        self.assertEqual((4, 27.0, 12.0), (from_dict.turn_number, from_dict.my_health, from_dict.get_resource(from_dict.CORES)), "A decoded state should give the same turn info")
+        self.assertEqual(bytes(from_string.game_map.blocked_mask), bytes(from_dict.game_map.blocked_mask), "A decoded state should give the same firewalls")
+
+        self.assertEqual(0, message_type(state), "Wrong type for a turn")
+        self.assertEqual(1, message_type("""{"p2Units":[[]],"turnInfo": [1,4,12],"events":{}}"""), "Wrong type for an action frame")
+        self.assertEqual(2, message_type("""{"turnInfo":[2,9,0,5]}"""), "Wrong type for the end of the game")
+        self.assertIsNone(message_type("""{"debug":{},"timingAndReplay":{"replaySave":0}}"""), "The config has no type")
+
+    def test_parse_frame_events(self, adv=False):
+        frame = """{"p2Units":[[],[],[[14,20,40.0,"3"]],[],[],[],[]],"turnInfo":[1,4,12],"p1Stats":[27.0,12.0,7.0,0],"p1Units":[[[13,5,60.0,"1"]],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[[[13,27],1,3,"9",2],[[14,27],1,3,"10",2]],"damage":[[[13,5],4.0,0,"1",1]],"shield":[],"move":[],"spawn":[],"death":[[[14,20],2,"3",2,false]],"attack":[],"melee":[]}}"""
+        events = parse_frame_events(frame, ["breach", "death", "melee"])
+        expected = json.loads(frame)["events"]
+        self.assertEqual(["breach", "death", "melee"], sorted(events), "Only the requested event types should be decoded")
+        for event_type in events:
+            self.assertEqual(expected[event_type], events[event_type], "Wrong {} events".format(event_type))
+        self.assertEqual({"breach": []}, parse_frame_events("""{"turnInfo":[1,4,12], "events": {}}""", ["breach"]), "Missing event types should be empty")
+
+    def test_coalesce_frames(self, adv=False):
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.handled = []
+                self.breaches = []
+            def on_turn(self, game_state):
+                self.handled.append("turn")
+            def on_action_frame_events(self, events):
+                self.breaches.extend(breach[3] for breach in events["breach"])
+            def on_game_start(self, config):
+                #Falling behind here lets the reader thread queue up every other message
+                time.sleep(0.05)
+            def on_action_frame(self, frame):
+                self.handled.append(json.loads(frame)["turnInfo"][2])
+
+        frame = """{"turnInfo":[1,1,%d],"events":{"breach":[[[13,27],1,3,"%d",2]]}}"""
+        messages = ["""{"timingAndReplay":{"replaySave":0},"unitInformation":[]}"""]
+        messages += [frame % (i, i) for i in range(5)]
+        messages += ["""{"turnInfo":[0,2,-1]}""", frame % (5, 5), """{"turnInfo":[2,2,0]}"""]
+        algo = RecordingAlgo()
+        algo.register_frame_events("breach")
+        algo.coalesce_frames = True
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("\n".join(messages) + "\n")
+        try:
+            algo.start()
+        finally:
+            sys.stdin = stdin
+
+        self.assertEqual([4, "turn", 5], algo.handled, "Queued frames should be skipped, but never past a turn")
+        self.assertEqual(0, algo.skipped_frames, "The last frame was not queued up")
+        self.assertEqual([str(i) for i in range(6)], algo.breaches, "Events from skipped frames should still be passed on")
+
+    def test_background_task(self, adv=False):
+        class BackgroundAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.results = []
+                self.register_background_task(self.precompute)
+            def precompute(self, cancelled):
+                steps = 0
+                while not cancelled.is_set():
+                    steps += 1
+                    cancelled.wait(0.001)
+                return steps
+            def on_turn(self, game_state):
+                self.results.append(self.background_result)
+
+        messages = ["""{"timingAndReplay":{"replaySave":0},"unitInformation":[]}"""]
+        messages += ["""{"turnInfo":[0,0,-1]}""", """{"turnInfo":[1,0,0],"events":{}}""", """{"turnInfo":[0,1,-1]}""", """{"turnInfo":[2,1,0]}"""]
+        algo = BackgroundAlgo()
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("\n".join(messages) + "\n")
+        try:
+            algo.start()
+        finally:
+            sys.stdin = stdin
+
+        self.assertIsNone(algo.results[0], "There is no background result on the first turn")
+        self.assertIsInstance(algo.results[1], int, "The background task's result should be passed to the next turn")
+        self.assertIsNone(algo._background, "The background task should be cancelled at the end of the game")
+
+        #A task that ignores the cancel event must not hold up the turn, or be started again while it runs
+        started = []
+        def stubborn(cancelled):
+            started.append(threading.current_thread())
+            time.sleep(1)
+            return 0
+        algo = BackgroundAlgo()
+        algo.register_background_task(stubborn)
+        stubborn_messages = messages[:-1] + ["""{"turnInfo":[1,1,0],"events":{}}""", """{"turnInfo":[0,2,-1]}""", messages[-1]]
+        sys.stdin = io.StringIO("\n".join(stubborn_messages) + "\n")
+        start_time = time.perf_counter()
+        try:
+            algo.start()
+        finally:
+            sys.stdin = stdin
+        self.assertLess(time.perf_counter() - start_time, 0.9, "The turn waited for a task that was not cancelled")
+        self.assertEqual([None, None, None], algo.results, "A late task's result should be dropped")
+        self.assertTrue(algo.background_running, "A late task should be reported as still running")
+        self.assertEqual(1, len(started), "A task that is still running should not be started again")
+
+    def test_deadline(self, adv=False):
+        now = [0.0]
+        deadline = Deadline(1.0, 0.0, clock=lambda: now[0])
+        defense = deadline.phase("defense", 0.5)
+        self.assertAlmostEqual(0.5, defense.budget, msg="A phase should get its share of the remaining time")
+        now[0] = 0.6
+        self.assertTrue(defense.expired(), "The phase should run out before the turn")
+        self.assertFalse(deadline.expired(), "The turn should still have time left")
+        self.assertAlmostEqual(0.4, deadline.phase("attack").budget, msg="Later phases get the time earlier ones left")
+        self.assertIs(defense, deadline.phases["defense"], "Phases should be kept by name")
+
+        def candidates():
+            for value in [3, 7, 5, 9]:
+                now[0] += 0.15
+                yield value
+        best = deadline.anytime(candidates(), lambda value: value)
+        self.assertEqual(7, best.value, "The best candidate scored before the deadline should be kept")
+        self.assertFalse(best.complete, "Not every candidate was scored in time")
+        self.assertEqual("plan", deadline.anytime([1], lambda value: value, "plan").value, "The default is used once time is up")
+
+        config = {"timingAndReplay": {"waitTimeBotSoft": 5000}}
+        self.assertAlmostEqual(4.0, turn_deadline(config, start=0).budget, msg="The budget should be a safe share of the soft limit")
+        self.assertAlmostEqual(3.5, turn_deadline(config, 1500, 1.0, start=0).budget, msg="Time the engine counted beyond our own should come off the budget")
+        self.assertAlmostEqual(1.0, turn_deadline(config, start=0, limit=1).budget, msg="The budget should never pass the limit")
+
+    def test_debug_log(self, adv=False):
+        stream = io.StringIO()
+        log = DebugLog(level=INFO, limit=2, stream=stream)
+        log.write(DEBUG, "hidden")
+        log.write(INFO, "a", 1)
+        log.write(INFO, "b")
+        log.write(INFO, "c")
+        log.write(ERROR, "d")
+        self.assertEqual("", stream.getvalue(), "Nothing should be written before a flush")
+        log.flush()
+        self.assertEqual("a, 1\nb\nd\nDropped 1 debug messages, the limit is 2\n", stream.getvalue(), "Wrong debug output")
+        log.write(INFO, "e")
+        log.flush()
+        self.assertTrue(stream.getvalue().endswith("Dropped 1 debug messages, the limit is 2\ne\n"), "The limit should reset every flush")
+
+        raw = io.BytesIO()
+        stdout = sys.stdout
+        sys.stdout = io.TextIOWrapper(raw, encoding="ascii")
+        try:
+            send_command("[[\"FF\", 13, 0]] \udc80")
+            self.assertEqual(b'[["FF", 13, 0]] \\udc80\n', raw.getvalue(), "Commands should be written immediately, escaping what cannot be encoded")
+        finally:
+            sys.stdout = stdout
+
     def test_print_unit(self, adv=False):
         game = self.make_turn_0_map(adv)
 
@@ -1,9 +1,72 @@
+from collections import namedtuple
+
 def is_stationary(unit_type, firewall_types):
     return unit_type in firewall_types
 
+# The indices in config["unitInformation"] of the firewall types, and of the encryptor. The same order GameState uses
+FIREWALL_INDICES = (0, 1, 2)
+ENCRYPTOR_INDEX = 1
+
+class UnitStats(namedtuple("UnitStats", ["config", "unit_type", "type_code", "stationary", "speed", "damage",
+        "damage_f", "damage_i", "range", "max_stability", "cost"])):
+    """The stats shared by every unit of one type. Built once per config, see get_unit_stats
+
+    Attributes:
+        * config (JSON): The config the stats were read from
+        * unit_type (string): The unit type
+        * type_code (int): The index of the unit type in config["unitInformation"]
+        * stationary (bool): Whether or not this unit type is a firewall
+        * speed (float): A unit will move once every 1/speed frames, 0 for firewalls
+        * damage (int): The amount of damage a firewall deals to enemy information. The shield amount for encryptors. None for information
+        * damage_f (int): The amount of damage an information unit deals to enemy firewalls. None for firewalls
+        * damage_i (int): The amount of damage an information unit deals to enemy information. None for firewalls
+        * range (float): The effective range of the unit type
+        * max_stability (float): The starting stability of the unit type
+        * cost (int): The resource cost of the unit type
+
+    """
+    __slots__ = ()
+
+# Stats for each config, keyed on id(config). The config is kept alongside so its id cannot be reused
+_unit_stats = {}
+
+def get_unit_stats(config):
+    """Gets the stats of every unit type in a config
+
+    Args:
+        * config (JSON): Contains information about the game
+
+    Returns:
+        A dict mapping each unit type to its UnitStats
+
+    """
+    cached = _unit_stats.get(id(config))
+    if cached is not None and cached[0] is config:
+        return cached[1]
+
+    stats = {}
+    for type_code, type_config in enumerate(config["unitInformation"]):
+        if "stability" not in type_config:
+            #Remove is not a real unit
+            continue
+        stationary = type_code in FIREWALL_INDICES
+        if stationary:
+            damage = type_config["shieldAmount"] if type_code == ENCRYPTOR_INDEX else type_config["damage"]
+            speed, damage_f, damage_i = 0, None, None
+        else:
+            damage = None
+            speed, damage_f, damage_i = type_config["speed"], type_config["damageF"], type_config["damageI"]
+        unit_type = type_config["shorthand"]
+        stats[unit_type] = UnitStats(config, unit_type, type_code, stationary, speed, damage, damage_f, damage_i,
+            type_config["range"], type_config["stability"], type_config["cost"])
+    _unit_stats[id(config)] = (config, stats)
+    return stats
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of the unit's type are shared with every other unit of the same type, see UnitStats.
+
     Attributes:
         * unit_type (string): This unit's type
         * config (JSON): Contains information about the game
@@ -19,38 +82,61 @@ class GameUnit:
         * max_stability (float): The starting stability of this unit. Note than stability can be increased beyond this value by encryptors
         * stability (float): The current health of this unit
         * cost (int): The resource cost of this unit
+        * stats (:obj: UnitStats): The stats of this unit's type
 
     """
+    __slots__ = ("stats", "player_index", "x", "y", "stability", "pending_removal")
+
     def __init__(self, unit_type, config, player_index=None, stability=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
-        self.unit_type = unit_type
-        self.config = config
+        self.stats = get_unit_stats(config)[unit_type]
         self.player_index = player_index
         self.pending_removal = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.stability = self.max_stability if not stability else stability
-
-    def __serialize_type(self):
-        from .game_state import FIREWALL_TYPES, UNIT_TYPE_TO_INDEX, ENCRYPTOR
-        self.stationary = is_stationary(self.unit_type, FIREWALL_TYPES)
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        if self.stationary:
-            self.speed = 0
-            if self.unit_type == ENCRYPTOR:
-                self.damage = type_config["shieldAmount"]
-            else:
-                self.damage = type_config["damage"]
-        else:
-            self.speed = type_config["speed"]
-            self.damage_f = type_config["damageF"]
-            self.damage_i = type_config["damageI"]
-        self.range = type_config["range"]
-        self.max_stability = type_config["stability"]
-        self.cost = type_config["cost"]
+        self.stability = self.stats.max_stability if not stability else stability
+
+    @property
+    def unit_type(self):
+        return self.stats.unit_type
+
+    @property
+    def config(self):
+        return self.stats.config
+
+    @property
+    def stationary(self):
+        return self.stats.stationary
+
+    @property
+    def speed(self):
+        return self.stats.speed
+
+    @property
+    def damage(self):
+        return self.stats.damage
+
+    @property
+    def damage_f(self):
+        return self.stats.damage_f
+
+    @property
+    def damage_i(self):
+        return self.stats.damage_i
+
+    @property
+    def range(self):
+        return self.stats.range
+
+    @property
+    def max_stability(self):
+        return self.stats.max_stability
+
+    @property
+    def cost(self):
+        return self.stats.cost
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -1,8 +1,16 @@
+import atexit
 import sys
+import threading
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+# Levels for debug_write, messages below DebugLog.level are dropped
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
 
 def get_command():
     """Gets input from stdin
@@ -21,21 +29,124 @@ def get_command():
         exit()
     return ret
 
+def read_commands(commands):
+    """Puts every line from stdin on a queue, then None once stdin closes.
+    Used by AlgoCore's background reader thread when coalescing frames
+
+    """
+    while True:
+        try:
+            ret = sys.stdin.readline()
+        except EOFError:
+            ret = ""
+        if ret == "":
+            commands.put(None)
+            return
+        commands.put(ret)
+
+def _write(stream, text):
+    """Writes text to a stream as utf-8 bytes if it has a binary buffer, so messages that cannot be encoded
+    with the stream's encoding are escaped instead of raising
+
+    """
+    buffer = getattr(stream, "buffer", None)
+    if buffer is None:
+        stream.write(text)
+    else:
+        #Anything written to the text layer has to go out first
+        stream.flush()
+        buffer.write(text.encode("utf-8", "backslashreplace"))
+    stream.flush()
+
+class DebugLog:
+    """Buffers debug output and writes it to stderr in one go when flushed.
+    AlgoCore flushes it once per turn and when the game ends, so verbose debugging does not add syscalls to hot loops.
+    Use the module level debug_log, for example::
+
+        gamelib.util.debug_log.level = gamelib.util.WARNING
+
+    Attributes:
+        * level (int): Messages below this level are dropped without being formatted
+        * limit (int): The most messages kept between flushes, None for no limit. ERROR messages are always kept
+        * max_buffer (int): The buffer is flushed early once it holds this many characters
+        * dropped (int): The number of messages dropped by the limit since the last flush
+
+    """
+    def __init__(self, level=INFO, limit=1000, max_buffer=1 << 16, stream=None):
+        self.level = level
+        self.limit = limit
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._stream = stream
+        self._lines = []
+        self._count = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def enabled(self, level):
+        """Checks whether a message at a level would be kept, to skip building expensive messages
+
+        """
+        return level >= self.level
+
+    def write(self, level, *msg):
+        """Adds a message to the buffer
+
+        Args:
+            * level: The level of the message, DEBUG, INFO, WARNING or ERROR
+            * msg: The message to output, its parts are joined with commas
+
+        """
+        if level < self.level:
+            return
+        if self.limit is not None and self._count >= self.limit and level < ERROR:
+            self.dropped += 1
+            return
+        line = ", ".join(map(str, msg)).strip() + "\n"
+        with self._lock:
+            self._lines.append(line)
+            self._count += 1
+            self._size += len(line)
+            full = self._size >= self.max_buffer
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes out everything buffered since the last flush
+
+        """
+        with self._lock:
+            lines = self._lines
+            if self.dropped:
+                lines.append("Dropped {} debug messages, the limit is {}\n".format(self.dropped, self.limit))
+                self.dropped = 0
+            self._lines = []
+            self._count = 0
+            self._size = 0
+        if lines:
+            try:
+                _write(self._stream or sys.stderr, "".join(lines))
+            except (OSError, ValueError):
+                #The game closed stderr, there is nowhere left to write
+                pass
+
+debug_log = DebugLog()
+atexit.register(debug_log.flush)
+
 def send_command(cmd):
-    """Sends your turn to standard output.
+    """Sends your turn to standard output. Unlike debug output it is never buffered.
     Should usually only be called by 'GameState.submit_turn()'
 
     """
-    sys.stdout.write(cmd.strip() + "\n")
-    sys.stdout.flush()
+    _write(sys.stdout, cmd.strip() + "\n")
 
-def debug_write(*msg):
-    """Prints a message to the games debug output
+def debug_write(*msg, level=INFO):
+    """Prints a message to the games debug output. The output is buffered until debug_log is flushed
 
     Args:
         * msg: The message to output
+        * level: The level of the message, DEBUG, INFO, WARNING or ERROR
 
     """
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
-    sys.stderr.flush()
+    debug_log.write(level, *msg)